@@ -0,0 +1,279 @@
+"""benchmarks of modutils.aio and modutils.http against a local stand-in HTTP server
+
+every scenario runs in a new process so its peak memory is its own, results are written as json and can be compared
+with the results of another run
+
+    python -m benchmarks.bench --output results.json
+    python -m benchmarks.bench --output new.json --compare results.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+
+from datetime import datetime, timezone
+from time import perf_counter, sleep
+from typing import Callable, Dict, List, Union
+
+from benchmarks.server import StandInServer
+
+SCENARIOS: Dict[str, Callable[[dict], dict]] = {}
+
+
+def scenario(function: Callable[[dict], dict]) -> Callable[[dict], dict]:
+    """register a scenario, it gets the config and returns tasks, seconds, concurrency, task_seconds and
+    latencies, and optionally errors"""
+    SCENARIOS[function.__name__] = function
+    return function
+
+
+def timed(function: Callable, latencies: List[float]) -> Callable:
+    """wrap a function to append the seconds of every call to latencies"""
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            latencies.append(perf_counter() - start)
+    return wrapper
+
+
+def noop(x: int) -> int:
+    return x
+
+
+def quiet_session(cls: type, **kwargs):
+    """session that builds no log records, so only the requests are measured"""
+    from modutils.logs import RequestLog
+    return cls(request_log=RequestLog(sample_rate=0, error_sample_rate=0), **kwargs)
+
+
+@scenario
+def aioloop_noop(config: dict) -> dict:
+    from modutils import aioloop
+    latencies = []
+    tasks = config['tasks'] * 10
+    start = perf_counter()
+    aioloop(timed(noop, latencies), [[x] for x in range(tasks)], max_async_pool=config['concurrency'],
+            disable_progress_bar=True)
+    return {'tasks': tasks, 'seconds': perf_counter() - start, 'concurrency': config['concurrency'],
+            'task_seconds': 0.0, 'latencies': latencies}
+
+
+@scenario
+def aioloop_sleep(config: dict) -> dict:
+    from modutils import aioloop
+    latencies = []
+    start = perf_counter()
+    aioloop(timed(sleep, latencies), [[config['sleep']]] * config['tasks'], max_async_pool=config['concurrency'],
+            disable_progress_bar=True)
+    return {'tasks': config['tasks'], 'seconds': perf_counter() - start, 'concurrency': config['concurrency'],
+            'task_seconds': config['sleep'], 'latencies': latencies}
+
+
+@scenario
+def aioloop_coroutine_sleep(config: dict) -> dict:
+    from modutils import aioloop
+    latencies = []
+
+    async def wait(seconds: float) -> None:
+        start = perf_counter()
+        await asyncio.sleep(seconds)
+        latencies.append(perf_counter() - start)
+
+    start = perf_counter()
+    aioloop(wait, [[config['sleep']]] * config['tasks'], max_async_pool=config['concurrency'],
+            disable_progress_bar=True)
+    return {'tasks': config['tasks'], 'seconds': perf_counter() - start, 'concurrency': config['concurrency'],
+            'task_seconds': config['sleep'], 'latencies': latencies}
+
+
+@scenario
+def aiobulk_noop(config: dict) -> dict:
+    from modutils.decorators import aiobulk
+    latencies = []
+    bulk_noop = aiobulk(timed(noop, latencies))
+    tasks = config['tasks'] * 10
+    start = perf_counter()
+    bulk_noop.bulk([[x] for x in range(tasks)], max_async_pool=config['concurrency'], disable_progress_bar=True)
+    return {'tasks': tasks, 'seconds': perf_counter() - start, 'concurrency': config['concurrency'],
+            'task_seconds': 0.0, 'latencies': latencies}
+
+
+def response_result(responses: list, tasks: int, seconds: float, concurrency: int, config: dict) -> dict:
+    """result of an http scenario, latencies are the elapsed time of each response"""
+    return {'tasks': tasks, 'seconds': seconds, 'concurrency': concurrency, 'task_seconds': config['latency'],
+            'latencies': [response.elapsed.total_seconds() for response in responses],
+            'errors': sum(1 for response in responses if response.status_code >= 400)}
+
+
+@scenario
+def session_sequential(config: dict) -> dict:
+    from modutils.http import BaseSession
+    session = quiet_session(BaseSession)
+    tasks = max(config['tasks'] // 4, 1)
+    url = f'{config["url"]}/sequential'
+    start = perf_counter()
+    responses = [session.get(url) for _ in range(tasks)]
+    return response_result(responses, tasks, perf_counter() - start, 1, config)
+
+
+def async_session_bulk(config: dict, engine: str) -> dict:
+    from modutils import AioRunner
+    from modutils.http import BaseAsyncSession
+    session = quiet_session(BaseAsyncSession, engine=engine, pool_maxsize=config['concurrency'],
+                            pool_connections=config['concurrency'])
+    args = [[f'{config["url"]}/bulk/{x}'] for x in range(config['tasks'])]
+    with AioRunner(max_workers=config['concurrency']) as runner:
+        start = perf_counter()
+        responses = session.get.bulk(args, max_async_pool=config['concurrency'], runner=runner,
+                                     disable_progress_bar=True)
+        seconds = perf_counter() - start
+        session.close()
+    return response_result(responses, config['tasks'], seconds, config['concurrency'], config)
+
+
+@scenario
+def async_session_bulk_requests(config: dict) -> dict:
+    return async_session_bulk(config, 'requests')
+
+
+@scenario
+def async_session_bulk_asyncio(config: dict) -> dict:
+    return async_session_bulk(config, 'asyncio')
+
+
+def percentile(values: List[float], q: float) -> Union[float, None]:
+    """nearest rank percentile"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(q * len(values) + 0.5)) - 1))]
+
+
+def peak_rss_kb() -> Union[int, None]:
+    """peak resident memory of the process in kilobytes"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def run_scenario(name: str, config: dict, results: multiprocessing.Queue) -> None:
+    """run a scenario in the current process and put its summary on results"""
+    sys.path.insert(0, config['root'])
+    try:
+        measured = SCENARIOS[name](config)
+    except Exception as error:
+        results.put({'name': name, 'error': repr(error)})
+        return
+    latencies, tasks, seconds = measured['latencies'], measured['tasks'], measured['seconds']
+    ideal_seconds = tasks * measured['task_seconds'] / measured['concurrency']
+    results.put({
+        'name': name,
+        'tasks': tasks,
+        'concurrency': measured['concurrency'],
+        'seconds': seconds,
+        'throughput': tasks / seconds if seconds else None,
+        'overhead_per_task_us': max(seconds - ideal_seconds, 0) / tasks * 1e6 if tasks else None,
+        'latency_p50': percentile(latencies, 0.5),
+        'latency_p99': percentile(latencies, 0.99),
+        'errors': measured.get('errors', 0),
+        'peak_rss_kb': peak_rss_kb(),
+    })
+
+
+def git_revision(root: str) -> Union[str, None]:
+    """current git revision of the repository, if it is one"""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[str]:
+    """compare throughput and p99 latency with a baseline run
+
+    :param results: results of this run
+    :param baseline: results of the baseline run
+    :param threshold: fraction a metric can get worse by before it is a regression
+
+    :return: list of regressions
+    """
+    before = {result['name']: result for result in baseline['results'] if 'error' not in result}
+    regressions = []
+    for result in results['results']:
+        previous = before.get(result['name'])
+        if previous is None or 'error' in result:
+            continue
+        for metric, worse in (('throughput', lambda new, old: new < old * (1 - threshold)),
+                              ('latency_p99', lambda new, old: new > old * (1 + threshold)),
+                              ('peak_rss_kb', lambda new, old: new > old * (1 + threshold))):
+            new, old = result.get(metric), previous.get(metric)
+            if new is not None and old and worse(new, old):
+                regressions.append(f'{result["name"]} {metric}: {old:.6g} -> {new:.6g} ({(new - old) / old:+.1%})')
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS),
+                        help='scenarios to run; default all')
+    parser.add_argument('--tasks', type=int, default=2000, help='tasks of each scenario; default 2000')
+    parser.add_argument('--concurrency', type=int, default=64, help='max_async_pool of each scenario; default 64')
+    parser.add_argument('--sleep', type=float, default=0.01, help='seconds of the sleep scenarios; default 0.01')
+    parser.add_argument('--latency', type=float, default=0.005, help='seconds of server latency; default 0.005')
+    parser.add_argument('--payload-size', type=int, default=1024, help='bytes of server responses; default 1024')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of 503 responses; default 0.0')
+    parser.add_argument('--output', help='path to write the json results to; default stdout')
+    parser.add_argument('--compare', help='path of the json results of a baseline run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='fraction a metric can get worse by before it is a regression; default 0.1')
+    options = parser.parse_args(argv)
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    config = {'tasks': options.tasks, 'concurrency': options.concurrency, 'sleep': options.sleep,
+              'latency': options.latency, 'payload_size': options.payload_size, 'error_rate': options.error_rate,
+              'root': root}
+    context = multiprocessing.get_context('spawn')
+    results = {'meta': {'timestamp': datetime.now(timezone.utc).isoformat(), 'revision': git_revision(root),
+                        'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpu_count': os.cpu_count(), 'config': {k: v for k, v in config.items() if k != 'root'}},
+               'results': []}
+    with StandInServer(options.latency, options.payload_size, options.error_rate) as server:
+        config['url'] = server.url
+        for name in options.scenarios:
+            queue = context.Queue()
+            process = context.Process(target=run_scenario, args=(name, config, queue))
+            process.start()
+            result = queue.get()
+            process.join()
+            results['results'].append(result)
+            print(f'{name}: ' + (result['error'] if 'error' in result else
+                                 f'{result["throughput"]:.1f}/s, p99 {result["latency_p99"]:.6f}s, '
+                                 f'{result["peak_rss_kb"]}KB'), file=sys.stderr)
+
+    text = json.dumps(results, indent=2)
+    if options.output:
+        with open(options.output, 'w') as fout:
+            fout.write(text)
+    else:
+        print(text)
+    if options.compare:
+        with open(options.compare, 'r') as fin:
+            regressions = compare(results, json.load(fin), options.threshold)
+        for regression in regressions:
+            print(f'regression: {regression}', file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+import random
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from time import sleep
+from urllib.parse import parse_qsl, urlsplit
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are separate writes, with Nagle a small keep-alive response waits on the delayed ack
+    disable_nagle_algorithm = True
+    server: 'StandInServer'
+
+    def _respond(self) -> None:
+        """wait for the latency, then answer with the payload or an error
+
+        the latency, size and error_rate of the server can be overridden by the query of a request
+        """
+        query = dict(parse_qsl(urlsplit(self.path).query))
+        latency = float(query.get('latency', self.server.latency))
+        size = int(query.get('size', self.server.payload_size))
+        error_rate = float(query.get('error_rate', self.server.error_rate))
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        if latency:
+            sleep(latency)
+        if error_rate and random.random() < error_rate:
+            status, body = 503, b''
+        else:
+            status, body = 200, self.server.payload if size == len(self.server.payload) else b'x' * size
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_HEAD = _respond
+
+    def log_message(self, format: str, *args) -> None:
+        """requests are not logged, writing them would be measured too"""
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, latency: float = 0.0, payload_size: int = 1024, error_rate: float = 0.0,
+                 host: str = '127.0.0.1', port: int = 0):
+        """initialize StandInServer
+        a local keep-alive HTTP server with configurable latency, payload size and error rate, run on a background
+        thread with a thread per connection
+
+        :param latency: seconds to wait before every response; default 0.0
+        :param payload_size: bytes of the body of every response; default 1024
+        :param error_rate: fraction of responses answered with 503; default 0.0
+        :param host: address to listen on; default 127.0.0.1
+        :param port: port to listen on, 0 picks a free one; default 0
+        """
+        super().__init__((host, port), StandInHandler)
+        self.latency = latency
+        self.payload_size = payload_size
+        self.error_rate = error_rate
+        self.payload = b'x' * payload_size
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """base url of the server"""
+        return f'http://{self.server_address[0]}:{self.server_address[1]}'
+
+    def start(self) -> 'StandInServer':
+        """serve on a background thread"""
+        self._thread = Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """stop serving and close the socket"""
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
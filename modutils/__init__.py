@@ -1,4 +1,5 @@
-from typing import Any, Union, Tuple, Iterable
+from functools import total_ordering
+from typing import Any, Iterable, List, Tuple, Union
 from re import compile, Pattern
 from time import sleep
 from json import dumps
@@ -8,7 +9,7 @@ from colored import fg, style
 from subprocess import Popen, PIPE
 
 
-from modutils.aio import aioloop
+from modutils.aio import AdaptiveLimit, AioRunner, aioloop, aioloop_iter, aiorun
 from modutils.http import BaseSession
 
 '''
@@ -19,6 +20,7 @@ Utils to help with new types
 '''
 
 sha256_pattern: Pattern = compile('[A-Fa-f0-9]{64}')  # non case sensitive matching, can return non unique
+NGET_CONTAINERS = (dict, list)  # types a compiled nget path indexes, any other type raises KeyError like nget
 
 def nget(dictionary: dict, keys: Iterable, default: Any = None) -> Any:
     """nget - nested get call to easily retrieve nested information with a single call and set a default
@@ -37,28 +39,134 @@ def nget(dictionary: dict, keys: Iterable, default: Any = None) -> Any:
     return dictionary
 
 
+class nget_path(object):
+    __slots__ = ('keys', 'default')
+
+    def __init__(self, keys: Iterable, default: Any = None):
+        """a compiled nget path, the keys are resolved once and the path is walked with a single try block
+        Ex.
+            first_name = nget.compile(['users', 0, 'name'])
+            first_name(record)
+
+        keys index dicts, and integer keys also index lists. A missing key or index returns the default, a key on
+        any other type, str and bytes included, raises KeyError like nget
+
+        :param keys: iterable of keys and list indices
+        :param default: value returned if a key or index is not found; default None
+        """
+        self.keys = tuple(keys)
+        self.default = default
+
+    def __call__(self, dictionary: Any) -> Any:
+        """get the value of the path in a record"""
+        value = dictionary
+        try:
+            for key in self.keys:
+                if not isinstance(value, NGET_CONTAINERS):
+                    raise TypeError
+                value = value[key]
+        except (KeyError, IndexError):
+            return self.default
+        except TypeError:
+            raise KeyError(f'About to attempt retrieval of {key} on improper type of {type(value)}')
+        return value
+
+    def __repr__(self):
+        return f'nget_path({list(self.keys)!r}, default={self.default!r})'
+
+
+def nget_columns(records: Iterable, paths: Iterable, default: Any = None) -> List[list]:
+    """nget_columns - get one or more paths from every record in a single pass, see nget_path
+    Ex.
+        names, ages = nget.columns(records, [['user', 'name'], ['user', 'age']])
+
+    :param records: iterable of records
+    :param paths: iterable of key paths or nget_path
+    :param default: value of a path that is not found, unless it is a nget_path; default None
+    :return: list of a column per path, with the value of the path in every record
+    """
+    paths = [path if isinstance(path, nget_path) else nget_path(path, default) for path in paths]
+    columns = [[] for _ in paths]
+    steps = tuple((path.keys, path.default, column.append) for path, column in zip(paths, columns))
+    for record in records:
+        for keys, missing, append in steps:
+            value = record
+            try:
+                for key in keys:
+                    if not isinstance(value, NGET_CONTAINERS):
+                        raise TypeError
+                    value = value[key]
+            except (KeyError, IndexError):
+                value = missing
+            except TypeError:
+                raise KeyError(f'About to attempt retrieval of {key} on improper type of {type(value)}')
+            append(value)
+    return columns
+
+
+nget.compile = nget_path
+nget.columns = nget_columns
+
+
+@total_ordering
 class sha256:
+    __slots__ = ('digest',)
     name = 'sha256'
 
-    def __init__(self, value):
+    def __init__(self, value: Any):
         """convert a valid sha256 string to object
 
-        :param value: value to convert to sha256 object
+        the 32 byte digest is stored once, so objects are small, hashable and ordered by digest, and hex strings
+        of any case are equal
+
+        :param value: value to convert to sha256 object, a hex string, a 32 byte digest, 64 hex bytes or a sha256
         """
+        if isinstance(value, sha256):
+            self.digest = value.digest
+            return
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            value = bytes(value)
+            if len(value) == 32:
+                self.digest = value
+                return
+            value = value.decode('ascii', 'replace')
         value_str = str(value)
-        self.__value__ = value_str if sha256_pattern.match(value_str) else None
-        if not self.__value__:
+        if not sha256_pattern.fullmatch(value_str):
             raise TypeError(f'{value!r} is not a valid sha256 type')
+        self.digest = bytes.fromhex(value_str)
 
     def __str__(self):
         """print sha256 object as lowercase"""
-        return self.__value__.lower()
+        return self.digest.hex()
+
+    def __repr__(self):
+        return f'sha256({self.digest.hex()!r})'
+
+    def __bytes__(self):
+        return self.digest
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def __reduce__(self):
+        return sha256, (self.digest,)
 
     def __eq__(self, value):
-        """compare sha256 objects, convert to lower so that upper case is equal to lower case"""
-        if self.__value__.lower() == sha256(value).__value__.lower():
-            return True
-        return False
+        """compare sha256 objects, or a sha256 object and a value that converts to one"""
+        if not isinstance(value, sha256):
+            try:
+                value = sha256(value)
+            except TypeError:
+                return NotImplemented
+        return self.digest == value.digest
+
+    def __lt__(self, value):
+        if not isinstance(value, sha256):
+            try:
+                value = sha256(value)
+            except TypeError:
+                return NotImplemented
+        return self.digest < value.digest
 
 
 '''
@@ -3,8 +3,11 @@ import sys
 
 from functools import update_wrapper
 from copy import copy
-from concurrent.futures import ThreadPoolExecutor
-from typing import Callable, List, NewType
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from itertools import islice
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, NewType, Sized, Tuple, \
+    Union
 from functools import partial
 from colored import fg, style
 from tqdm import tqdm
@@ -12,18 +15,466 @@ from tqdm import tqdm
 Eventloop = NewType('Eventloop', asyncio.windows_events._WindowsSelectorEventLoop) \
         if sys.platform == 'win32' else NewType('Eventloop', asyncio.unix_events._UnixSelectorEventLoop)
 
+EXECUTORS = ('thread', 'process')
+PROCESS_CHUNKSIZE = 64
+
+FAILURE_STATUS_CODES = (429, 500, 502, 503, 504)
+LATENCY_FLOOR = 0.001
+
+_process_pools: Dict[int, ProcessPoolExecutor] = {}
+
+
+def _split_args(fnargs: list) -> Tuple[list, dict]:
+    """split a list of arguments into positional arguments and named arguments
+
+    :param fnargs {list}: list of arguments, any dictionary found is treated as named arguments
+
+    :return tuple of positional arguments and named arguments
+    """
+    args, kwargs = [], {}
+    for arg in fnargs:
+        if isinstance(arg, dict):
+            kwargs.update(arg)
+        else:
+            args.append(arg)
+    return args, kwargs
+
+
+def _call_chunk(function: Callable, chunk: List[Tuple[list, dict]]) -> list:
+    """call function for every set of arguments in a chunk, runs inside a worker process
+
+    :param function {Callable}: function to map to arguments
+    :param chunk {List[Tuple[list, dict]]}: list of positional and named arguments
+
+    :return list of results in the order of the chunk
+    """
+    return [function(*args, **kwargs) for args, kwargs in chunk]
+
+
+async def _call_coroutine(semaphore: asyncio.Semaphore, function: Callable, args: list, kwargs: dict):
+    """await a coroutine function once the semaphore allows it
+
+    :param semaphore {asyncio.Semaphore}: semaphore limiting the number of coroutines running at once
+    :param function {Callable}: coroutine function to call
+    :param args {list}: positional arguments
+    :param kwargs {dict}: named arguments
+
+    :return result of the coroutine
+    """
+    async with semaphore:
+        return await function(*args, **kwargs)
+
+
+def _process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """get a process pool that is reused across calls, a new one is created if none exists or it is broken
+
+    :param max_workers {int}: number of worker processes in the pool
+
+    :return process pool
+    """
+    pool = _process_pools.get(max_workers)
+    if pool is None or pool._broken:
+        pool = _process_pools[max_workers] = ProcessPoolExecutor(max_workers=max_workers)
+    return pool
+
+
+def _progress_bar_format(progress_bar_color: str, progress_bar_format: str = None) -> str:
+    """build the default colored progress bar format if one was not given
+
+    :param progress_bar_color {str}: color of progress bar
+    :param progress_bar_format {str}: format for progress bar output; default: None
+
+    :return progress bar format
+    """
+    if progress_bar_format is None:
+        progress_bar_format = '{l_bar}%s{bar}%s| {n_fmt}/{total_fmt} [{elapsed}<{remaining},' \
+                 ' {rate_fmt}{postfix}]' % (fg(progress_bar_color), style.RESET)
+    return progress_bar_format
+
+
+class AdaptiveLimit(object):
+
+    def __init__(self, min_limit: int = 1, max_limit: int = 64, initial_limit: int = None,
+                 backoff_ratio: float = 0.5, latency_tolerance: float = 2.0, smoothing: float = 0.2,
+                 baseline_smoothing: float = 0.01, failure_status_codes: Iterable = FAILURE_STATUS_CODES):
+        """initialize AdaptiveLimit
+        an AIMD concurrency limit that aioloop and aiobulk use to raise or lower the number of futures in flight
+
+        the limit grows by one each time a full limit of futures finish without congestion and is multiplied by
+        backoff_ratio, at most once per limit of finished futures, when congestion is seen. A future is congested
+        if it raised, returned a response with a status code in failure_status_codes, or the smoothed latency is
+        more than latency_tolerance times the baseline latency (never less than LATENCY_FLOOR seconds). The
+        baseline is a slower moving average of the same latencies, so ordinary variance is not seen as congestion
+        and the baseline follows the upstream when its latency changes for good
+
+        an AdaptiveLimit keeps what it learned, reuse the same one across calls to the same upstream
+
+        :param min_limit {int}: lowest number of futures in flight; default: 1
+        :param max_limit {int}: highest number of futures in flight; default: 64
+        :param initial_limit {int}: number of futures in flight to start with; default: half of max_limit
+        :param backoff_ratio {float}: multiplier applied to the limit on congestion; default: 0.5
+        :param latency_tolerance {float}: ratio of smoothed to baseline latency seen as congestion, None to only use
+            failures; default: 2.0
+        :param smoothing {float}: weight of the newest latency in the smoothed latency; default: 0.2
+        :param baseline_smoothing {float}: weight of the newest latency in the baseline latency, lower than
+            smoothing; default: 0.01
+        :param failure_status_codes {Iterable}: status codes of returned responses seen as congestion;
+            default: FAILURE_STATUS_CODES
+        """
+        if min_limit < 1 or max_limit < min_limit:
+            raise ValueError(f'{"min_limit"!r} must be greater than 0 and not greater than {"max_limit"!r}')
+        if not 0 < backoff_ratio < 1:
+            raise ValueError(f'{"backoff_ratio"!r} must be between 0 and 1')
+        if not 0 < baseline_smoothing < smoothing <= 1:
+            raise ValueError(f'{"baseline_smoothing"!r} must be greater than 0 and less than {"smoothing"!r}')
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+        self.baseline_smoothing = baseline_smoothing
+        self.failure_status_codes = frozenset(failure_status_codes)
+        self.baseline_latency = None
+        self.smoothed_latency = None
+        self._limit = float(min(max(initial_limit or max_limit // 2, min_limit), max_limit))
+        self._since_backoff = 0
+
+    @property
+    def limit(self) -> int:
+        """current number of futures allowed in flight"""
+        return int(self._limit)
+
+    def failed(self, result: Any) -> bool:
+        """check a result, or list of results from a chunk, for a failure status code
+
+        :param result: result returned by the function
+
+        :return True if a result has a status code in failure_status_codes
+        """
+        results = result if isinstance(result, list) else (result,)
+        return any(getattr(res, 'status_code', None) in self.failure_status_codes for res in results)
+
+    def update(self, latency: float, failed: bool = False) -> None:
+        """update the limit with the outcome of a finished future
+
+        :param latency {float}: seconds the future took to finish
+        :param failed {bool}: the future raised or returned a failure status code
+        """
+        self._since_backoff += 1
+        if self.smoothed_latency is None:
+            self.smoothed_latency = self.baseline_latency = latency
+        else:
+            self.smoothed_latency += self.smoothing * (latency - self.smoothed_latency)
+            self.baseline_latency += self.baseline_smoothing * (latency - self.baseline_latency)
+        congested = failed or (self.latency_tolerance is not None and self.smoothed_latency >
+                               self.latency_tolerance * max(self.baseline_latency, LATENCY_FLOOR))
+        if not congested:
+            self._limit = min(self._limit + 1 / self._limit, self.max_limit)
+        elif self._since_backoff >= self._limit:
+            self._limit = max(self._limit * self.backoff_ratio, self.min_limit)
+            self._since_backoff = 0
+
+
+async def _aiostream(function: Callable, args_iter: Iterable, loop: Eventloop, executor: Executor,
+                     max_in_flight: int, ordered: bool = False, reorder_buffer: int = None,
+                     chunksize: int = 1, max_async_pool: int = 16,
+                     adaptive: AdaptiveLimit = None) -> AsyncIterator:
+    """keep a window of futures in flight and yield each result as soon as it is finished
+
+    a new future is only created when a running one finishes, so memory stays flat no matter how many
+    arguments are given and the pool never drains while waiting on the slowest future of a slice. args_iter is
+    read again every time a future finishes, so an iterator that ran out can be given more arguments, for example
+    from the results already yielded, and the stream only ends once it is empty with no future left in flight
+
+    when ordered, finished futures are held in a reorder buffer until every future before them has been
+    yielded. No new future is created while the span between the oldest unyielded and the newest future is
+    reorder_buffer wide, so a single slow future holds back new work instead of growing the buffer
+
+    when chunksize is greater than 1 each future runs a chunk of arguments, max_in_flight and reorder_buffer
+    then count chunks instead of single calls
+
+    coroutine functions are scheduled directly on the loop as tasks, limited to max_async_pool running at once
+    by a semaphore, the executor and chunksize are not used for them
+
+    with an adaptive limit, the number of futures in flight follows adaptive.limit, capped by max_in_flight, and
+    the latency and outcome of every finished future is fed back to it
+
+    :param function {Callable}: function to map to arguments
+    :param args_iter {Iterable}: iterable or generator of arguments to send to function
+    :param loop {Eventloop}: asyncio loop running the futures
+    :param executor {Executor}: executor the function is run in
+    :param max_in_flight {int}: max number of futures to have in flight at once
+    :param ordered {bool}: yield results in the order of the arguments; default: False
+    :param reorder_buffer {int}: max number of results held back to restore order; default: max_in_flight
+    :param chunksize {int}: number of arguments sent to the executor in a single future; default: 1
+    :param max_async_pool {int}: max number of coroutines running at once; default: 16
+    :param adaptive {AdaptiveLimit}: limit to adjust the number of futures in flight with; default: None
+
+    :return async iterator of results
+    """
+    if reorder_buffer is None:
+        reorder_buffer = max_in_flight
+    semaphore = None
+    if asyncio.iscoroutinefunction(function):
+        semaphore = asyncio.Semaphore(max_async_pool)
+        chunksize = 1
+    args_iter = iter(args_iter)
+    pending = {}
+    finished = {}
+    started = {}
+    submitted = yielded = 0
+    limit = max_in_flight
+    try:
+        while True:
+            if adaptive is not None:
+                limit = min(adaptive.limit, max_in_flight)
+            while len(pending) < limit and (not ordered or submitted - yielded < reorder_buffer):
+                chunk = [_split_args(fnargs) for fnargs in islice(args_iter, chunksize)]
+                if not chunk:
+                    break
+                if semaphore is not None:
+                    future = loop.create_task(_call_coroutine(semaphore, function, *chunk[0]))
+                elif chunksize == 1:
+                    future = loop.run_in_executor(executor, partial(function, *chunk[0][0], **chunk[0][1]))
+                else:
+                    future = loop.run_in_executor(executor, partial(_call_chunk, function, chunk))
+                pending[future] = submitted
+                submitted += 1
+                if adaptive is not None:
+                    started[future] = loop.time()
+                if len(chunk) < chunksize:
+                    break
+            if not pending:
+                return
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if adaptive is not None:
+                now = loop.time()
+                for future in done:
+                    failed = future.cancelled() or future.exception() is not None or adaptive.failed(future.result())
+                    adaptive.update(now - started.pop(future), failed)
+            if ordered:
+                for future in done:
+                    finished[pending.pop(future)] = future
+                done = []
+                while yielded in finished:
+                    done.append(finished.pop(yielded))
+                    yielded += 1
+            for future in done:
+                pending.pop(future, None)
+                if chunksize == 1:
+                    yield future.result()
+                else:
+                    for result in future.result():
+                        yield result
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+class AioRunner(object):
+
+    def __init__(self, max_workers: int = 16, loop: Eventloop = None):
+        """initialize AioRunner
+        a long lived runner that owns one event loop and one warm thread pool to reuse across aioloop calls
+
+        a runner drives its loop from the calling thread, it should only be used by one thread at a time
+
+        :param max_workers {int}: number of workers in the thread pool, and process pool if one is used; default: 16
+        :param loop {Eventloop}: a pre-defined asyncio loop, it is not closed with the runner; default: None
+        """
+        self.max_workers = max_workers
+        self._owns_loop = loop is None
+        self.loop = asyncio.new_event_loop() if loop is None else loop
+        self._thread_pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def executor(self, executor: str = 'thread') -> Executor:
+        """get the executor of the runner, the thread pool is created on first use
+
+        :param executor {str}: 'thread' or 'process', process pools are shared across calls; default: thread
+
+        :return executor
+        """
+        if executor not in EXECUTORS:
+            raise ValueError(f'{"executor"!r} must be one of {EXECUTORS}, not {executor!r}')
+        if executor == 'process':
+            return _process_pool(self.max_workers)
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self._thread_pool
+
+    def run(self, coroutine: Awaitable) -> Any:
+        """run a coroutine on the loop of the runner until it is complete
+
+        :param coroutine {Awaitable}: coroutine to run
+
+        :return result of the coroutine
+        """
+        return self.loop.run_until_complete(coroutine)
+
+    def close(self) -> None:
+        """shutdown the thread pool and close the loop if it is owned by the runner"""
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown()
+            self._thread_pool = None
+        if self._owns_loop and not self.loop.is_closed():
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            self.loop.close()
+
+
+def _stream_options(function: Callable, max_async_pool: int, max_in_flight: int, ordered: bool,
+                    reorder_buffer: int, executor: str, chunksize: int,
+                    adaptive: Union[bool, AdaptiveLimit] = None) -> dict:
+    """validate the options shared by aioloop_iter and aiorun and fill in their defaults
+
+    :return dict of named arguments for _aiostream
+    """
+    if executor not in EXECUTORS:
+        raise ValueError(f'{"executor"!r} must be one of {EXECUTORS}, not {executor!r}')
+    if executor == 'process' and asyncio.iscoroutinefunction(function):
+        raise ValueError(f'{"executor"!r} cannot be \'process\' for coroutine function {function!r}')
+    if chunksize is None:
+        chunksize = PROCESS_CHUNKSIZE if executor == 'process' else 1
+    if chunksize < 1:
+        raise ValueError(f'{"chunksize"!r} must be greater than 0')
+    if max_in_flight is None:
+        max_in_flight = max_async_pool * 2
+    if max_in_flight < 1:
+        raise ValueError(f'{"max_in_flight"!r} must be greater than 0')
+    if reorder_buffer is not None and reorder_buffer < 1:
+        raise ValueError(f'{"reorder_buffer"!r} must be greater than 0')
+    if adaptive is True:
+        adaptive = AdaptiveLimit(max_limit=max_async_pool)
+    return dict(max_in_flight=max_in_flight, ordered=ordered, reorder_buffer=reorder_buffer, chunksize=chunksize,
+                max_async_pool=max_async_pool, adaptive=adaptive or None)
+
+
+async def aiorun(function: Callable, args_iter: Iterable, max_async_pool: int = 16, max_in_flight: int = None,
+                 ordered: bool = False, reorder_buffer: int = None, executor: str = 'thread', chunksize: int = None,
+                 runner: AioRunner = None, adaptive: Union[bool, AdaptiveLimit] = None) -> list:
+    """run on the already running loop and return results, for use in code that is already async
+
+    Ex.
+        results = await aiorun(function, args_list)
+
+    :param fn {Callable}: function or coroutine function to map to arguments
+    :param args_iter {Iterable}: iterable or generator of arguments to send to function, it is consumed lazily
+    :param max_async_pool {int}: max async pool, this will define the number of processes or coroutines to run at once
+    :param max_in_flight {int}: max number of futures to keep in flight at once; default: max_async_pool * 2
+    :param ordered {bool}: return results in the order of the arguments instead of the order they are finished
+    :param reorder_buffer {int}: max number of finished results held back to restore order, new futures wait
+        while it is full; default: max_in_flight
+    :param executor {str}: 'thread' or 'process', use process for cpu bound functions; default: thread
+    :param chunksize {int}: number of arguments sent to a worker at once; default: 1 for thread and
+        PROCESS_CHUNKSIZE for process
+    :param runner {AioRunner}: runner to take a warm executor from, its loop is not used; default: None
+    :param adaptive {Union[bool, AdaptiveLimit]}: adjust the number of futures in flight from latency and failures,
+        True uses an AdaptiveLimit up to max_async_pool; default: None
+
+    :return list of results
+    """
+    options = _stream_options(function, max_async_pool, max_in_flight, ordered, reorder_buffer, executor, chunksize,
+                              adaptive)
+    if asyncio.iscoroutinefunction(function):
+        pool = nullcontext()
+    elif runner is not None:
+        pool = nullcontext(runner.executor(executor))
+    elif executor == 'process':
+        pool = nullcontext(_process_pool(max_async_pool))
+    else:
+        pool = ThreadPoolExecutor(max_workers=max_async_pool)
+    with pool as pool:
+        return [result async for result in _aiostream(function, args_iter, asyncio.get_running_loop(), pool,
+                                                      **options)]
+
+
+def aioloop_iter(function: Callable, args_iter: Iterable, loop: Eventloop = None, max_async_pool: int = 16,
+                 max_in_flight: int = None, ordered: bool = False, reorder_buffer: int = None,
+                 executor: str = 'thread', chunksize: int = None, runner: AioRunner = None,
+                 adaptive: Union[bool, AdaptiveLimit] = None, disable_progress_bar: bool = False,
+                 progress_bar_color: str = 'green_3a', progress_bar_format: str = None) -> Iterator:
+    """create new aioloop and yield results as they are finished
+
+    :param fn {Callable}: function or coroutine function to map to arguments
+    :param args_iter {Iterable}: iterable or generator of arguments to send to function, it is consumed lazily and
+        read again as futures finish, so an iterator can be given more arguments while results are yielded
+    :param loop {Eventloop}: a pre-defined asyncio loop
+    :param max_async_pool {int}: max async pool, this will define the number of processes or coroutines to run at once
+    :param max_in_flight {int}: max number of futures to keep in flight at once; default: max_async_pool * 2
+    :param ordered {bool}: yield results in the order of the arguments instead of the order they are finished
+    :param reorder_buffer {int}: max number of finished results held back to restore order, new futures wait
+        while it is full; default: max_in_flight
+    :param executor {str}: 'thread' or 'process', the process pool is reused across calls and the function and
+        arguments must be picklable. Coroutine functions run on the loop without an executor; default: thread
+    :param chunksize {int}: number of arguments sent to a worker at once, max_in_flight and reorder_buffer count
+        chunks; default: 1 for thread and PROCESS_CHUNKSIZE for process
+    :param runner {AioRunner}: runner whose loop and warm executor are reused, its max_workers sizes the executor
+        instead of max_async_pool. Without a runner a loop and thread pool are created and closed per call
+    :param adaptive {Union[bool, AdaptiveLimit]}: adjust the number of futures in flight from latency and failures,
+        including failure status codes of returned responses. True uses an AdaptiveLimit up to max_async_pool,
+        the executor still caps it at max_async_pool; default: None
+    :param disable_progress_bar {bool}: disable progress bar from printing
+    :param progress_bar_color {str}: color of progress bar; default: green
+    :param progress_bar_format {str}: format for progress bar output; default: None
+
+    :return iterator of results, in the order they are finished unless ordered is set
+    """
+    if loop is not None and runner is not None:
+        raise ValueError(f'{"loop"!r} and {"runner"!r} cannot both be set')
+    options = _stream_options(function, max_async_pool, max_in_flight, ordered, reorder_buffer, executor, chunksize,
+                              adaptive)
+    total = len(args_iter) if isinstance(args_iter, Sized) else None
+    owns_runner = runner is None
+    if owns_runner:
+        runner = AioRunner(max_workers=max_async_pool, loop=loop)
+    try:
+        pool = None if asyncio.iscoroutinefunction(function) else runner.executor(executor)
+        with tqdm(total=total, disable=disable_progress_bar,
+                  bar_format=_progress_bar_format(progress_bar_color, progress_bar_format)) as progress_bar:
+            stream = _aiostream(function, args_iter, runner.loop, pool, **options)
+            try:
+                while True:
+                    try:
+                        result = runner.run(stream.__anext__())
+                    except StopAsyncIteration:
+                        return
+                    progress_bar.update()
+                    yield result
+            finally:
+                runner.run(stream.aclose())
+    finally:
+        if owns_runner:
+            runner.close()
+
 
 def aioloop(function: Callable, args_list: List[List], loop: Eventloop = None,
-                max_async_pool: int = 16, max_futures: int = 100000, disable_progress_bar: bool = False,
-                progress_bar_color: str = 'green_3a', progress_bar_format: str= None) -> list:
+                max_async_pool: int = 16, max_futures: int = 100000, ordered: bool = False,
+                reorder_buffer: int = None, executor: str = 'thread', chunksize: int = None,
+                runner: AioRunner = None, adaptive: Union[bool, AdaptiveLimit] = None,
+                disable_progress_bar: bool = False, progress_bar_color: str = 'green_3a',
+                progress_bar_format: str= None) -> list:
     """create new aioloop, run, and return results
 
-    :param fn {Callable}: function to map to arguments
+    :param fn {Callable}: function or coroutine function to map to arguments
     :param args_list {List[List]}: list of arguments to send to function
     :param loop {Eventloop}: a pre-defined asyncio loop
     :param max_async_pool {int}: max async pool, this will define the number of processes to run at once
-    :param max_futures {int}: max futures, this will define the number of processes to setup and execute at once.
-        If there is a lot of arguments and futures is very large, can cause memory issues.
+    :param max_futures {int}: max futures, this will define the number of futures to keep in flight at once.
+        It is capped at twice the number of workers, more futures would only wait in the executor queue
+    :param ordered {bool}: return results in the order of the arguments instead of the order they are finished
+    :param reorder_buffer {int}: max number of finished results held back to restore order, new futures wait
+        while it is full; default: max_futures
+    :param executor {str}: 'thread' or 'process', use process for cpu bound functions; default: thread
+    :param chunksize {int}: number of arguments sent to a worker at once; default: 1 for thread and
+        PROCESS_CHUNKSIZE for process
+    :param runner {AioRunner}: runner whose loop and warm executor are reused across calls; default: None
+    :param adaptive {Union[bool, AdaptiveLimit]}: adjust the number of futures in flight from latency and failures,
+        True uses an AdaptiveLimit up to max_async_pool; default: None
     :param disable_progress_bar {bool}: disable progress bar from printing
     :param progress_bar_color {str}: color of progress bar; default: green
     :param progress_bar_format {str}: format for progress bar output; default: None
@@ -31,34 +482,14 @@ def aioloop(function: Callable, args_list: List[List], loop: Eventloop = None,
 
     :return list of results
     """
-    async def aioexecutor() -> list:
-        """aioexecutor will create futures from args and collect results as they are finished in the async loop
-
-        :return: list -- list of results from aio loop
-        """
-        results = []
-        with ThreadPoolExecutor(max_workers=max_async_pool) as executor:
-            for index in range(0, len(args_list), max_futures):
-                futures = []
-                for fnargs in args_list[index:index+max_futures]:
-                    fnkwargs = {}
-                    for index in range(0, len(fnargs)):
-                        if isinstance(fnargs[index], dict):
-                            fnkwargs.update(fnargs.pop(index))
-                    futures.append(loop.run_in_executor(executor, partial(function, *fnargs, **fnkwargs)))
-                results.extend([
-                    await result for result in tqdm(asyncio.as_completed(futures), total=len(futures),
-                                                    disable=disable_progress_bar, bar_format=progress_bar_format)
-                ])
-        return results
-
-    if progress_bar_format is None:
-        progress_bar_format = '{l_bar}%s{bar}%s| {n_fmt}/{total_fmt} [{elapsed}<{remaining},' \
-                 ' {rate_fmt}{postfix}]' % (fg(progress_bar_color), style.RESET)
-    if loop is None:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-    return loop.run_until_complete(aioexecutor())
+    workers = max_async_pool if runner is None or asyncio.iscoroutinefunction(function) else runner.max_workers
+    if reorder_buffer is None and ordered:
+        reorder_buffer = max_futures
+    return list(aioloop_iter(function, args_list, loop=loop, max_async_pool=max_async_pool,
+                             max_in_flight=min(max_futures, workers * 2), ordered=ordered,
+                             reorder_buffer=reorder_buffer, executor=executor, chunksize=chunksize, runner=runner,
+                             adaptive=adaptive, disable_progress_bar=disable_progress_bar,
+                             progress_bar_color=progress_bar_color, progress_bar_format=progress_bar_format))
 
 
 class aiobulk(object):
@@ -88,6 +519,8 @@ class aiobulk(object):
             return self
 
     def bulk(self, args_list: List[list], loop: Eventloop = None, max_async_pool: int = 16, max_futures: int = 100000,
+             ordered: bool = False, reorder_buffer: int = None, executor: str = 'thread', chunksize: int = None,
+             runner: AioRunner = None, adaptive: Union[bool, AdaptiveLimit] = None,
              disable_progress_bar: bool = False, progress_bar_color: str = 'green_3a',
              progress_bar_format: str = None) -> list:
         """add a method called 'bulk' to given function
@@ -97,6 +530,13 @@ class aiobulk(object):
             :param max_async_pool {int}: max async pool, this will define the number of processes to run at once
             :param max_futures {int}: max futures, this will define the number of processes to setup and execute at once.
                 If there is a lot of arguments and futures is very large, can cause memory issues.
+            :param ordered {bool}: return results in the order of the arguments; default: False
+            :param reorder_buffer {int}: max number of finished results held back to restore order; default: max_futures
+            :param executor {str}: 'thread' or 'process', use process for cpu bound functions; default: thread
+            :param chunksize {int}: number of arguments sent to a worker at once; default: 1 for thread, 64 for process
+            :param runner {AioRunner}: runner whose loop and warm executor are reused across calls; default: None
+            :param adaptive {Union[bool, AdaptiveLimit]}: adjust the number of futures in flight from latency and
+                failures, True uses an AdaptiveLimit up to max_async_pool; default: None
             :param disable_progress_bar {bool}: disable progress bar from printing
             :param progress_bar_color {str}: color of progress bar; default: green
             :param progress_bar_format {str}: format for progress bar output; default: None
@@ -129,6 +569,47 @@ class aiobulk(object):
         if self.__self__ is not None:
             args_list = [[self.__self__] + args for args in args_list]
         return aioloop(self.__bound__, args_list, loop=loop, max_async_pool=max_async_pool, max_futures=max_futures,
-                       disable_progress_bar=disable_progress_bar, progress_bar_color=progress_bar_color,
-                       progress_bar_format=progress_bar_format)
+                       ordered=ordered, reorder_buffer=reorder_buffer, executor=executor, chunksize=chunksize,
+                       runner=runner, adaptive=adaptive, disable_progress_bar=disable_progress_bar,
+                       progress_bar_color=progress_bar_color, progress_bar_format=progress_bar_format)
+
+    def bulk_iter(self, args_iter: Iterable, loop: Eventloop = None, max_async_pool: int = 16,
+                  max_in_flight: int = None, ordered: bool = False, reorder_buffer: int = None,
+                  executor: str = 'thread', chunksize: int = None, runner: AioRunner = None,
+                  adaptive: Union[bool, AdaptiveLimit] = None, disable_progress_bar: bool = False,
+                  progress_bar_color: str = 'green_3a', progress_bar_format: str = None) -> Iterator:
+        """add a method called 'bulk_iter' to given function, yields results as they are finished
+
+            :param args_iter {Iterable}: iterable or generator of arguments, it is consumed lazily
+            :param loop {Eventloop}: a pre-defined asyncio loop
+            :param max_async_pool {int}: max async pool, this will define the number of processes to run at once
+            :param max_in_flight {int}: max number of futures to keep in flight at once; default: max_async_pool * 2
+            :param ordered {bool}: yield results in the order of the arguments; default: False
+            :param reorder_buffer {int}: max number of finished results held back to restore order; default: max_in_flight
+            :param executor {str}: 'thread' or 'process', use process for cpu bound functions; default: thread
+            :param chunksize {int}: number of arguments sent to a worker at once; default: 1 for thread, 64 for process
+            :param runner {AioRunner}: runner whose loop and warm executor are reused across calls; default: None
+            :param adaptive {Union[bool, AdaptiveLimit]}: adjust the number of futures in flight from latency and
+                failures, True uses an AdaptiveLimit up to max_async_pool; default: None
+            :param disable_progress_bar {bool}: disable progress bar from printing
+            :param progress_bar_color {str}: color of progress bar; default: green
+            :param progress_bar_format {str}: format for progress bar output; default: None
+
+            Examples:
+                @aiobulk
+                def add(x:int,y:int)->int:return x+y
+
+                args = ([x,y] for x in range(0,5000) for y in range(5,10))
+                for result in add.bulk_iter(args):
+                    print(result)
+
+            :return iterator of results, in the order they are finished unless ordered is set
+        """
+        if self.__self__ is not None:
+            args_iter = ([self.__self__] + list(args) for args in args_iter)
+        return aioloop_iter(self.__bound__, args_iter, loop=loop, max_async_pool=max_async_pool,
+                            max_in_flight=max_in_flight, ordered=ordered, reorder_buffer=reorder_buffer,
+                            executor=executor, chunksize=chunksize, runner=runner, adaptive=adaptive,
+                            disable_progress_bar=disable_progress_bar, progress_bar_color=progress_bar_color,
+                            progress_bar_format=progress_bar_format)
 
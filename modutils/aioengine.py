@@ -0,0 +1,388 @@
+import asyncio
+import ssl
+import zlib
+
+from datetime import timedelta
+from http.client import HTTPMessage
+from time import monotonic
+from types import SimpleNamespace
+from typing import Any, Dict, List, Tuple, Union, Text
+from urllib.parse import urljoin, urlsplit
+from requests import PreparedRequest, Request, Response, exceptions
+from requests.cookies import extract_cookies_to_jar, merge_cookies
+from requests.structures import CaseInsensitiveDict
+from requests.utils import default_headers, get_encoding_from_headers
+
+ACCEPT_ENCODING = 'gzip, deflate'
+REDIRECT_STATUS_CODES = (301, 302, 303, 307, 308)
+REQUEST_KWARGS = ('params', 'data', 'json', 'headers', 'cookies', 'files', 'auth')
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+STREAM_LIMIT = 2 ** 16
+
+Connection = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+class AsyncHTTPEngine(object):
+
+    def __init__(self, session: Any, max_idle_per_host: int = 32):
+        """initialize AsyncHTTPEngine
+        a non blocking HTTP/1.1 client on asyncio streams with a keep-alive connection pool per host
+
+        requests are prepared by the session, so session headers, auth and params apply, and returned as
+        requests.Response objects with the content already read and their cookies stored in the session. Requests
+        are resolved with the resolve_status_codes, retry policy and rate limiter of the session, the same as
+        BaseSession.session_request, connections that cannot be opened are retried up to session.retries times, and
+        failures are raised as requests.exceptions ConnectionError, SSLError and Timeout
+
+        connections belong to the loop they were opened on, the pool is closed when the engine is used from a
+        new loop, and bulk calls without a runner close it before their loop is closed. Use an AioRunner to keep
+        connections alive across bulk calls
+
+        :param session: BaseSession the engine prepares, resolves and logs requests with
+        :param max_idle_per_host: max number of idle connections kept open per host; default 32
+        """
+        self.session = session
+        self.max_idle_per_host = max_idle_per_host
+        self._idle: Dict[tuple, List[Connection]] = {}
+        self._loop = None
+        self._ssl_contexts = {}
+
+    def _ssl_context(self, verify: Union[bool, str]) -> ssl.SSLContext:
+        """get the ssl context for a verify option, contexts are reused across connections
+
+        :param verify: False to skip certificate verification, or a path to a ca bundle
+
+        :return: ssl context
+        """
+        context = self._ssl_contexts.get(verify)
+        if context is None:
+            if verify is False:
+                context = ssl.create_default_context()
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            elif isinstance(verify, str):
+                context = ssl.create_default_context(cafile=verify)
+            else:
+                context = ssl.create_default_context()
+            self._ssl_contexts[verify] = context
+        return context
+
+    async def _connect(self, key: tuple, verify: Union[bool, str]) -> Tuple[Connection, bool]:
+        """get an idle connection of a host or open a new one
+
+        :param key: scheme, host and port of the connection
+        :param verify: ssl verify option for https
+
+        :return: connection and True if it was reused from the pool
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self.close()
+            self._loop = loop
+        idle = self._idle.get(key)
+        while idle:
+            reader, writer = idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return (reader, writer), True
+            writer.close()
+        scheme, host, port = key
+        context = self._ssl_context(verify) if scheme == 'https' else None
+        connection = await asyncio.open_connection(host, port, ssl=context, limit=STREAM_LIMIT,
+                                                   server_hostname=host if context else None)
+        return connection, False
+
+    def _release(self, key: tuple, connection: Connection) -> None:
+        """return a connection to the idle pool of its host, or close it if the pool is full
+
+        :param key: scheme, host and port of the connection
+        :param connection: connection to release
+        """
+        idle = self._idle.setdefault(key, [])
+        if len(idle) < self.max_idle_per_host:
+            idle.append(connection)
+        else:
+            connection[1].close()
+
+    def idle_connections(self) -> List[tuple]:
+        """number of idle connections of every host
+
+        :return: list of (labels, idle connections) for every host
+        """
+        return [((('host', f'{host}:{port}'), ('scheme', scheme)), len(idle))
+                for (scheme, host, port), idle in list(self._idle.items())]
+
+    async def aclose(self) -> None:
+        """close every idle connection and wait until they are closed, on the loop they were opened on"""
+        idle, self._idle = self._idle, {}
+        writers = [writer for connections in idle.values() for _, writer in connections]
+        for writer in writers:
+            writer.close()
+        for writer in writers:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        """close every idle connection, they are only closed if their loop is still open"""
+        if self._loop is not None and not self._loop.is_closed():
+            for idle in self._idle.values():
+                for _, writer in idle:
+                    writer.close()
+        self._idle = {}
+
+    @staticmethod
+    def _encode_request(prepared: PreparedRequest) -> bytes:
+        """serialize a prepared request to an HTTP/1.1 request
+
+        :param prepared: request prepared by the session
+
+        :return: request bytes
+        """
+        body = prepared.body
+        if hasattr(body, 'read'):
+            body = body.read()
+        elif body is not None and not isinstance(body, (bytes, str)):
+            body = b''.join(chunk if isinstance(chunk, bytes) else chunk.encode('utf-8') for chunk in body)
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        headers = CaseInsensitiveDict(prepared.headers)
+        headers.setdefault('Host', urlsplit(prepared.url).netloc)
+        if headers.get('Accept-Encoding') == default_headers()['Accept-Encoding']:
+            headers['Accept-Encoding'] = ACCEPT_ENCODING
+        headers.pop('Transfer-Encoding', None)
+        if body or prepared.method not in ('GET', 'HEAD'):
+            headers['Content-Length'] = str(len(body or b''))
+        lines = [f'{prepared.method} {prepared.path_url} HTTP/1.1']
+        lines.extend(f'{name}: {value}' for name, value in headers.items())
+        return '\r\n'.join(lines).encode('latin-1') + b'\r\n\r\n' + (body or b'')
+
+    @staticmethod
+    async def _read_body(reader: asyncio.StreamReader, headers: CaseInsensitiveDict) -> Tuple[bytes, bool]:
+        """read a response body by chunked transfer encoding, content length, or until the connection closes
+
+        :param reader: stream of the connection
+        :param headers: headers of the response
+
+        :return: body and True if the connection can be reused
+        """
+        if 'chunked' in headers.get('Transfer-Encoding', '').lower():
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';', 1)[0].strip() or b'0', 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    return b''.join(chunks), True
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+        if 'Content-Length' in headers:
+            return await reader.readexactly(int(headers['Content-Length'])), True
+        return await reader.read(), False
+
+    @staticmethod
+    def _decode_body(body: bytes, headers: CaseInsensitiveDict) -> bytes:
+        """decode gzip or deflate content encoding
+
+        :param body: raw body of the response
+        :param headers: headers of the response
+
+        :return: decoded body
+        """
+        encoding = headers.get('Content-Encoding', '').lower()
+        if not body or encoding not in ('gzip', 'x-gzip', 'deflate'):
+            return body
+        if encoding == 'deflate':
+            try:
+                return zlib.decompress(body)
+            except zlib.error:
+                return zlib.decompress(body, -zlib.MAX_WBITS)
+        return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+
+    async def _exchange(self, connection: Connection, prepared: PreparedRequest) -> Tuple[Response, bool]:
+        """send a prepared request on a connection and read the response
+
+        :param connection: connection to use
+        :param prepared: request prepared by the session
+
+        :return: response and True if the connection can be reused
+        """
+        reader, writer = connection
+        writer.write(self._encode_request(prepared))
+        await writer.drain()
+        while True:
+            status_line = await reader.readline()
+            if not status_line:
+                raise ConnectionResetError(f'connection closed before a response to {prepared.url}')
+            version, status, reason = (status_line.decode('latin-1').rstrip('\r\n').split(' ', 2) + [''])[:3]
+            headers = CaseInsensitiveDict()
+            # every header line is kept apart for cookie extraction, Set-Cookie values cannot be joined
+            message = HTTPMessage()
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                name, value = name.strip(), value.strip()
+                headers[name] = f'{headers[name]}, {value}' if name in headers else value
+                message[name] = value
+            if not 100 <= int(status) < 200:
+                break
+        status = int(status)
+        if prepared.method == 'HEAD' or status in (204, 304):
+            body, keep_alive = b'', True
+        else:
+            body, keep_alive = await self._read_body(reader, headers)
+        connection_header = headers.get('Connection', '').lower()
+        keep_alive = keep_alive and connection_header != 'close' and \
+            (version == 'HTTP/1.1' or connection_header == 'keep-alive')
+
+        response = Response()
+        response.status_code = status
+        response.reason = reason
+        response.headers = headers
+        response._content = self._decode_body(body, headers)
+        response._content_consumed = True
+        response.encoding = get_encoding_from_headers(headers)
+        response.url = prepared.url
+        response.request = prepared
+        raw = SimpleNamespace(_original_response=SimpleNamespace(msg=message))
+        extract_cookies_to_jar(response.cookies, prepared, raw)
+        extract_cookies_to_jar(self.session.cookies, prepared, raw)
+        return response, keep_alive
+
+    async def _send(self, prepared: PreparedRequest, verify: Union[bool, str] = True) -> Response:
+        """send a prepared request on a pooled connection, a stale reused connection is retried once on a new one
+        and a connection that cannot be opened is retried with the backoff of the retry policy
+
+        :param prepared: request prepared by the session
+        :param verify: ssl verify option for https; default True
+
+        :return: response
+        """
+        parts = urlsplit(prepared.url)
+        if parts.scheme not in DEFAULT_PORTS:
+            raise ValueError(f'unsupported scheme {parts.scheme!r} in {prepared.url!r}')
+        key = (parts.scheme, parts.hostname, parts.port or DEFAULT_PORTS[parts.scheme])
+        start = monotonic()
+        connect_attempt = 1
+        while True:
+            try:
+                connection, reused = await self._connect(key, verify)
+            except ssl.SSLError:
+                raise
+            except OSError:
+                if connect_attempt > self.session.retries:
+                    raise
+                await asyncio.sleep(self.session.retry_policy.backoff(connect_attempt))
+                connect_attempt += 1
+                continue
+            try:
+                response, keep_alive = await self._exchange(connection, prepared)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                connection[1].close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                connection[1].close()
+                raise
+            break
+        if keep_alive:
+            self._release(key, connection)
+        else:
+            connection[1].close()
+        response.elapsed = timedelta(seconds=monotonic() - start)
+        return response
+
+    async def _request_once(self, method: str, url: Union[Text, bytes], timeout: Union[float, tuple] = None,
+                            allow_redirects: bool = True, verify: Union[bool, str] = None, **kwargs) -> Response:
+        """prepare and send a single request, following redirects
+
+        :param method: http method of the request
+        :param url: url for requests
+        :param timeout: seconds for each request and redirect, a (connect, read) tuple is summed; default None
+        :param allow_redirects: follow redirects; default True
+        :param verify: ssl verify option for https; default session.verify
+        :param kwargs: named arguments for requests, see REQUEST_KWARGS
+
+        :return: response
+        """
+        unsupported = set(kwargs) - set(REQUEST_KWARGS)
+        if unsupported:
+            raise TypeError(f'unsupported arguments for {type(self).__name__}: {sorted(unsupported)}')
+        if isinstance(timeout, tuple):
+            timeout = sum(part for part in timeout if part is not None)
+        if verify is None:
+            verify = self.session.verify
+        prepared = self.session.prepare_request(Request(method, url, **kwargs))
+        history = []
+        while True:
+            wait = self.session.rate_limiter.reserve(prepared.url) if self.session.rate_limiter is not None else 0
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                response = await asyncio.wait_for(self._send(prepared, verify), timeout)
+            except asyncio.TimeoutError as exc:
+                raise exceptions.Timeout(f'no response to {prepared.url} within {timeout} seconds',
+                                         request=prepared) from exc
+            except ssl.SSLError as exc:
+                raise exceptions.SSLError(exc, request=prepared) from exc
+            except (OSError, asyncio.IncompleteReadError) as exc:
+                raise exceptions.ConnectionError(exc, request=prepared) from exc
+            location = response.headers.get('Location')
+            if not allow_redirects or response.status_code not in REDIRECT_STATUS_CODES or not location:
+                break
+            if len(history) >= self.session.max_redirects:
+                break
+            history.append(response)
+            prepared = prepared.copy()
+            prepared.url = urljoin(prepared.url, location)
+            if response.status_code == 303 or (response.status_code in (301, 302) and prepared.method == 'POST'):
+                prepared.method = 'GET'
+                prepared.body = None
+                for name in ('Content-Length', 'Content-Type'):
+                    prepared.headers.pop(name, None)
+            if urlsplit(prepared.url).netloc != urlsplit(history[-1].url).netloc:
+                prepared.headers.pop('Authorization', None)
+            prepared.headers.pop('Cookie', None)
+            merge_cookies(prepared._cookies, self.session.cookies)
+            prepared.prepare_cookies(prepared._cookies)
+        response.history = history
+        return response
+
+    async def request(self, method: str, url: Union[Text, bytes], **kwargs) -> Response:
+        """send a request and attempt to resolve it the same as BaseSession.session_request
+
+        :param method: http method of the request
+        :param url: url for requests
+        :param kwargs: named arguments for requests, plus timeout, allow_redirects and verify
+
+        :return: response from the requests
+        """
+        method = method.upper()
+        if method == 'HEAD':
+            kwargs.setdefault('allow_redirects', False)
+        policy = self.session.retry_policy
+        metrics = self.session.metrics
+        policy.deposit()
+        start = monotonic()
+        attempt = 1
+        if metrics is not None:
+            metrics.add('http_requests_in_flight')
+        try:
+            response = await self._request_once(method, url, **kwargs)
+            while response.status_code not in self.session.resolve_status_codes:
+                delay = policy.next_delay(method, attempt, response, monotonic() - start)
+                if delay is None:
+                    break
+                await asyncio.sleep(delay)
+                response = await self._request_once(method, url, **kwargs)
+                attempt += 1
+        finally:
+            if metrics is not None:
+                metrics.add('http_requests_in_flight', value=-1)
+        if metrics is not None:
+            self.session.record_response(method, response, attempt, monotonic() - start)
+        self.session.log_response(response)
+        return response
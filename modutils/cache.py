@@ -0,0 +1,494 @@
+import json
+import os
+
+from collections import OrderedDict
+from email.mime.application import MIMEApplication
+from email.mime.base import MIMEBase
+from email.mime.image import MIMEImage
+from email.utils import parsedate_to_datetime
+from hashlib import sha256 as sha256_hash
+from threading import Lock
+from time import time
+from typing import Dict, Mapping, Tuple, Union
+from requests import PreparedRequest, Response
+from requests.structures import CaseInsensitiveDict
+
+CACHEABLE_STATUS_CODES = (200, 203, 300, 301, 308, 404, 410)
+UNCACHEABLE_VARY = ('*', 'cookie', 'authorization')
+ATTACHMENT_KINDS = ('attachment', 'logo')
+
+
+def parse_cache_control(value: str) -> Dict[str, Union[str, None]]:
+    """parse a Cache-Control header into a dict of lowercase directives
+
+    :param value: value of the Cache-Control header
+
+    :return: dict of directive to its value, or None if it has no value
+    """
+    directives = {}
+    for directive in (value or '').split(','):
+        name, _, argument = directive.strip().partition('=')
+        if name:
+            directives[name.lower()] = argument.strip('"') if argument else None
+    return directives
+
+
+class CachedResponse(object):
+    __slots__ = ('url', 'status_code', 'reason', 'headers', 'content', 'encoding', 'stored_at', 'expires_at',
+                 'vary')
+
+    def __init__(self, url: str, status_code: int, reason: str, headers: Mapping[str, str], content: bytes,
+                 encoding: str, stored_at: float, expires_at: float, vary: dict = None):
+        """initialize CachedResponse
+        the parts of a response kept by ResponseCache
+
+        :param url: url of the response
+        :param status_code: status code of the response
+        :param reason: reason of the response
+        :param headers: headers of the response, kept in a CaseInsensitiveDict
+        :param content: body of the response
+        :param encoding: encoding of the response
+        :param stored_at: time the response was stored or last revalidated
+        :param expires_at: time the response stops being fresh
+        :param vary: lowercase names of the request headers in the Vary header of the response, to the values they
+            had in the request; default None
+        """
+        self.url = url
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+        self.encoding = encoding
+        self.stored_at = stored_at
+        self.expires_at = expires_at
+        self.vary = vary or {}
+
+    @property
+    def size(self) -> int:
+        """approximate bytes held by the cached response"""
+        return len(self.content) + sum(len(name) + len(value) for name, value in self.headers.items())
+
+    @property
+    def fresh(self) -> bool:
+        """True if the response can be used without revalidation"""
+        return time() < self.expires_at
+
+    def matches(self, headers: Mapping[str, str]) -> bool:
+        """True if the response was stored for a request with the same values of the headers it varies by
+
+        :param headers: headers of the request
+        """
+        if self.vary and not isinstance(headers, CaseInsensitiveDict):
+            headers = CaseInsensitiveDict(headers)
+        return all(headers.get(name) == value for name, value in self.vary.items())
+
+    def validators(self) -> dict:
+        """conditional request headers to revalidate the response with
+
+        :return: dict of If-None-Match and If-Modified-Since headers
+        """
+        headers = {}
+        if 'ETag' in self.headers:
+            headers['If-None-Match'] = self.headers['ETag']
+        if 'Last-Modified' in self.headers:
+            headers['If-Modified-Since'] = self.headers['Last-Modified']
+        return headers
+
+    def to_response(self, request: PreparedRequest = None) -> Response:
+        """build a requests.Response from the cached response
+
+        :param request: request the response answers; default None
+
+        :return: response
+        """
+        response = Response()
+        response.url = self.url
+        response.status_code = self.status_code
+        response.reason = self.reason
+        response.headers = CaseInsensitiveDict(self.headers)
+        response._content = self.content
+        response._content_consumed = True
+        response.encoding = self.encoding
+        response.request = request
+        return response
+
+    def to_json(self) -> dict:
+        """metadata of the cached response for the disk tier, the content is stored separately"""
+        meta = {name: getattr(self, name) for name in self.__slots__ if name != 'content'}
+        meta['headers'] = dict(self.headers)
+        return meta
+
+
+class ResponseCache(object):
+
+    def __init__(self, max_size: int = 64 * 1024 * 1024, directory: str = None, max_disk_size: int = None,
+                 default_ttl: float = 0):
+        """initialize ResponseCache
+        a thread safe LRU cache of GET responses bounded by size in bytes, with an optional on-disk tier
+
+        freshness follows Cache-Control max-age, no-cache, no-store and Expires of the response. Stale responses
+        with an ETag or Last-Modified are kept so they can be revalidated with a conditional request, a 304 then
+        refreshes them without transferring the body again
+
+        :param max_size: max bytes of responses kept in memory, least recently used are evicted; default 64MB
+        :param directory: directory of the on-disk tier, responses evicted from memory are still found there;
+            default None
+        :param max_disk_size: max bytes of the on-disk tier, oldest files are removed first; default None, unbounded
+        :param default_ttl: seconds a response without freshness headers is fresh; default 0
+        """
+        self.max_size = max_size
+        self.directory = directory
+        self.max_disk_size = max_disk_size
+        self.default_ttl = default_ttl
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self._disk_size = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._disk_size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+    def stats(self) -> dict:
+        """counters of the cache
+
+        :return: dict of hits, misses, revalidations, evictions, entries and size
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'revalidations': self.revalidations,
+                'evictions': self.evictions, 'entries': len(self._entries), 'size': self.size}
+
+    def _path(self, key: str) -> str:
+        """base path of a key in the on-disk tier"""
+        return os.path.join(self.directory, sha256_hash(key.encode('utf-8')).hexdigest())
+
+    def _read_disk(self, key: str) -> Union[CachedResponse, None]:
+        """load a cached response from the on-disk tier
+
+        :param key: cache key
+
+        :return: cached response or None if it is not on disk
+        """
+        path = self._path(key)
+        try:
+            with open(f'{path}.json', 'r') as fin:
+                meta = json.load(fin)
+            with open(f'{path}.body', 'rb') as fin:
+                content = fin.read()
+        except (OSError, ValueError):
+            return None
+        if meta.pop('key', None) != key:
+            return None
+        return CachedResponse(content=content, **meta)
+
+    def _write_disk(self, key: str, entry: CachedResponse) -> None:
+        """write a cached response to the on-disk tier and remove the oldest files if it is full
+
+        :param key: cache key
+        :param entry: cached response
+        """
+        path = self._path(key)
+        meta = json.dumps(dict(entry.to_json(), key=key)).encode('utf-8')
+        for suffix, data in (('.body', entry.content), ('.json', meta)):
+            if os.path.exists(f'{path}{suffix}'):
+                self._disk_size -= os.path.getsize(f'{path}{suffix}')
+            with open(f'{path}{suffix}.tmp', 'wb') as fout:
+                fout.write(data)
+            os.replace(f'{path}{suffix}.tmp', f'{path}{suffix}')
+        self._disk_size += len(entry.content) + len(meta)
+        if self.max_disk_size is not None and self._disk_size > self.max_disk_size:
+            files = sorted((entry for entry in os.scandir(self.directory) if entry.is_file()),
+                           key=lambda entry: entry.stat().st_mtime)
+            self._disk_size = sum(entry.stat().st_size for entry in files)
+            for file in files:
+                if self._disk_size <= self.max_disk_size:
+                    break
+                self._disk_size -= file.stat().st_size
+                os.remove(file.path)
+
+    def _insert(self, key: str, entry: CachedResponse) -> None:
+        """insert a cached response in memory and evict least recently used responses, lock must be held
+
+        :param key: cache key
+        :param entry: cached response
+        """
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size -= previous.size
+        if entry.size > self.max_size:
+            return
+        self._entries[key] = entry
+        self.size += entry.size
+        while self.size > self.max_size:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.size
+            self.evictions += 1
+
+    def get(self, key: str, headers: Mapping[str, str] = None) -> Union[CachedResponse, None]:
+        """get a cached response from memory or the on-disk tier, fresh or stale
+        a fresh response counts as a hit, anything else as a miss
+
+        :param key: cache key
+        :param headers: headers of the request, a response stored for other values of the headers named by its
+            Vary header is not returned; default None, no headers
+
+        :return: cached response or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            elif self.directory:
+                entry = self._read_disk(key)
+                if entry is not None:
+                    self._insert(key, entry)
+            if entry is not None and not entry.matches(headers or {}):
+                entry = None
+            if entry is not None and entry.fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry
+
+    def expires_at(self, response: Response, now: float) -> Union[float, None]:
+        """time a response stops being fresh
+
+        :param response: response to read Cache-Control and Expires from
+        :param now: current time
+
+        :return: expiry time or None if the response must not be stored
+        """
+        cache_control = parse_cache_control(response.headers.get('Cache-Control'))
+        if 'no-store' in cache_control:
+            return None
+        if 'no-cache' in cache_control:
+            return now
+        try:
+            if 'max-age' in cache_control:
+                return now + int(cache_control['max-age']) - int(response.headers.get('Age', 0))
+        except (TypeError, ValueError):
+            return now
+        if 'Expires' in response.headers:
+            try:
+                return parsedate_to_datetime(response.headers['Expires']).timestamp()
+            except (TypeError, ValueError):
+                return now
+        return now + self.default_ttl
+
+    def store(self, key: str, response: Response) -> bool:
+        """store a response if it is cacheable
+
+        :param key: cache key
+        :param response: response to store, its content is read, the values of the headers named by its Vary
+            header are taken from its request
+
+        :return: True if the response was stored
+        """
+        if response.status_code not in CACHEABLE_STATUS_CODES:
+            return False
+        vary = {name.strip().lower() for name in response.headers.get('Vary', '').split(',') if name.strip()}
+        if vary.intersection(UNCACHEABLE_VARY):
+            return False
+        request_headers = response.request.headers if response.request is not None else {}
+        vary = {name: request_headers.get(name) for name in sorted(vary)}
+        now = time()
+        expires_at = self.expires_at(response, now)
+        if expires_at is None:
+            return False
+        entry = CachedResponse(response.url, response.status_code, response.reason, response.headers,
+                               response.content, response.encoding, now, expires_at, vary)
+        if not entry.fresh and not entry.validators():
+            return False
+        with self._lock:
+            self._insert(key, entry)
+            if self.directory:
+                self._write_disk(key, entry)
+        return True
+
+    def revalidate(self, key: str, entry: CachedResponse, response: Response) -> CachedResponse:
+        """refresh a cached response with the headers of a 304 response
+
+        :param key: cache key
+        :param entry: cached response that was revalidated
+        :param response: 304 response
+
+        :return: refreshed cached response
+        """
+        headers = CaseInsensitiveDict(entry.headers)
+        headers.update((name, value) for name, value in response.headers.items()
+                       if name.lower() not in ('content-length', 'content-encoding', 'transfer-encoding'))
+        response.headers = headers.copy()
+        now = time()
+        expires_at = self.expires_at(response, now)
+        refreshed = CachedResponse(entry.url, entry.status_code, entry.reason, headers, entry.content,
+                                   entry.encoding, now, now if expires_at is None else expires_at, entry.vary)
+        with self._lock:
+            self.revalidations += 1
+            self._insert(key, refreshed)
+            if self.directory:
+                self._write_disk(key, refreshed)
+        return refreshed
+
+
+class AttachmentCache(object):
+
+    def __init__(self, max_size: int = 256 * 1024 * 1024):
+        """initialize AttachmentCache
+        a thread safe LRU cache of email attachments and logos, read and base64 encoded once and kept as the text
+        of their MIME part, bounded by size in bytes
+
+        entries are keyed by path and kind, and are read again when the mtime or size of the file changed
+
+        :param max_size: max bytes of encoded parts kept, least recently used are evicted; default 256MB
+        """
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def stats(self) -> dict:
+        """counters of the cache
+
+        :return: dict of hits, misses, evictions, entries and size
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(self._entries), 'size': self.size}
+
+    @staticmethod
+    def part(path: str, kind: str = 'attachment') -> MIMEBase:
+        """read a file into a MIME part
+
+        :param path: path of the file
+        :param kind: 'attachment' for a named application part or 'logo' for an image part; default attachment
+
+        :return: MIME part
+        """
+        if kind not in ATTACHMENT_KINDS:
+            raise ValueError(f'{"kind"!r} must be one of {ATTACHMENT_KINDS}, not {kind!r}')
+        with open(path, 'rb') as fin:
+            data = fin.read()
+        if kind == 'logo':
+            return MIMEImage(data)
+        filename = os.path.basename(path)
+        attachment = MIMEApplication(data, Name=filename)
+        attachment['Content-Disposition'] = f'attachment; filename={filename}'
+        return attachment
+
+    def get(self, path: str, kind: str = 'attachment') -> str:
+        """get the encoded MIME part of a file, it is read and encoded if it is not cached or changed
+
+        :param path: path of the file
+        :param kind: kind of the part, see part; default attachment
+
+        :return: text of the MIME part, headers and base64 body
+        """
+        stat = os.stat(path)
+        key = (os.path.abspath(path), kind)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        text = self.part(path, kind).as_string()
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous[1])
+            if len(text) <= self.max_size:
+                self._entries[key] = (version, text)
+                self.size += len(text)
+                while self.size > self.max_size:
+                    _, (_, evicted) = self._entries.popitem(last=False)
+                    self.size -= len(evicted)
+                    self.evictions += 1
+        return text
+
+
+class FileHashCache(object):
+
+    def __init__(self, path: str = None):
+        """initialize FileHashCache
+        a thread safe cache of file digests keyed by absolute path, an entry is used while the size and mtime of the
+        file are unchanged
+
+        with path the entries are loaded from and saved to a json file, so a later run over unchanged files only
+        stats them
+
+        :param path: json file the entries are loaded from and saved to; default None to keep them in memory only
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, Tuple[int, int, bytes]] = {}
+        self._changed = False
+        self._lock = Lock()
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def stats(self) -> dict:
+        """counters of the cache
+
+        :return: dict of hits, misses and entries
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+    def get(self, path: str, stat: os.stat_result) -> Union[bytes, None]:
+        """get the digest of a file if it did not change since it was cached
+
+        :param path: path of the file
+        :param stat: current stat of the file
+
+        :return: digest or None if it is not cached or changed
+        """
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(path))
+            if entry is not None and entry[:2] == (stat.st_size, stat.st_mtime_ns):
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            return None
+
+    def set(self, path: str, stat: os.stat_result, digest: bytes) -> None:
+        """cache the digest of a file
+
+        :param path: path of the file
+        :param stat: stat of the file taken before it was hashed
+        :param digest: digest of the file
+        """
+        with self._lock:
+            self._entries[os.path.abspath(path)] = (stat.st_size, stat.st_mtime_ns, digest)
+            self._changed = True
+
+    def load(self) -> None:
+        """load the entries of the json file, an unreadable file leaves the cache empty"""
+        try:
+            with open(self.path, 'r') as fin:
+                entries = json.load(fin)
+            loaded = {path: (size, mtime_ns, bytes.fromhex(digest))
+                      for path, (size, mtime_ns, digest) in entries.items()}
+        except (OSError, ValueError, TypeError):
+            return
+        with self._lock:
+            self._entries = loaded
+            self._changed = False
+
+    def save(self) -> None:
+        """write the entries to the json file if they changed"""
+        if self.path is None:
+            return
+        with self._lock:
+            if not self._changed:
+                return
+            entries = {path: [size, mtime_ns, digest.hex()] for path, (size, mtime_ns, digest) in self._entries.items()}
+            self._changed = False
+        with open(f'{self.path}.tmp', 'w') as fout:
+            json.dump(entries, fout)
+        os.replace(f'{self.path}.tmp', self.path)
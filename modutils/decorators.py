@@ -1,7 +1,7 @@
 from functools import update_wrapper
-from typing import Callable, List
+from typing import Callable, Iterable, Iterator, List, Union
 
-from modutils.aio import Eventloop, aioloop
+from modutils.aio import AdaptiveLimit, AioRunner, Eventloop, aioloop, aioloop_iter
 
 class aiobulk(object):
 
@@ -34,6 +34,8 @@ class aiobulk(object):
             return self
 
     def bulk(self, args_list: List[list], loop: Eventloop = None, max_async_pool: int = 16, max_futures: int = 100000,
+             ordered: bool = False, reorder_buffer: int = None, executor: str = 'thread', chunksize: int = None,
+             runner: AioRunner = None, adaptive: Union[bool, AdaptiveLimit] = None,
              disable_progress_bar: bool = False, progress_bar_color: str = 'green_3a',
              progress_bar_format: str = None) -> list:
         """add a method called 'bulk' to given function
@@ -43,6 +45,13 @@ class aiobulk(object):
             :param max_async_pool {int}: max async pool, this will define the number of processes to run at once
             :param max_futures {int}: max futures, this will define the number of processes to setup and execute at once.
                 If there is a lot of arguments and futures is very large, can cause memory issues.
+            :param ordered {bool}: return results in the order of the arguments; default: False
+            :param reorder_buffer {int}: max number of finished results held back to restore order; default: max_futures
+            :param executor {str}: 'thread' or 'process', use process for cpu bound functions; default: thread
+            :param chunksize {int}: number of arguments sent to a worker at once; default: 1 for thread, 64 for process
+            :param runner {AioRunner}: runner whose loop and warm executor are reused across calls; default: None
+            :param adaptive {Union[bool, AdaptiveLimit]}: adjust the number of futures in flight from latency and
+                failures, True uses an AdaptiveLimit up to max_async_pool; default: None
             :param disable_progress_bar {bool}: disable progress bar from printing
             :param progress_bar_color {str}: color of progress bar; default: green
             :param progress_bar_format {str}: format for progress bar output; default: None
@@ -75,5 +84,46 @@ class aiobulk(object):
         if self.__self__ is not None:
             args_list = [[self.__self__] + args for args in args_list]
         return aioloop(self.__bound__, args_list, loop=loop, max_async_pool=max_async_pool, max_futures=max_futures,
-                       disable_progress_bar=disable_progress_bar, progress_bar_color=progress_bar_color,
-                       progress_bar_format=progress_bar_format)
\ No newline at end of file
+                       ordered=ordered, reorder_buffer=reorder_buffer, executor=executor, chunksize=chunksize,
+                       runner=runner, adaptive=adaptive, disable_progress_bar=disable_progress_bar,
+                       progress_bar_color=progress_bar_color, progress_bar_format=progress_bar_format)
+
+    def bulk_iter(self, args_iter: Iterable, loop: Eventloop = None, max_async_pool: int = 16,
+                  max_in_flight: int = None, ordered: bool = False, reorder_buffer: int = None,
+                  executor: str = 'thread', chunksize: int = None, runner: AioRunner = None,
+                  adaptive: Union[bool, AdaptiveLimit] = None, disable_progress_bar: bool = False,
+                  progress_bar_color: str = 'green_3a', progress_bar_format: str = None) -> Iterator:
+        """add a method called 'bulk_iter' to given function, yields results as they are finished
+
+            :param args_iter {Iterable}: iterable or generator of arguments, it is consumed lazily
+            :param loop {Eventloop}: a pre-defined asyncio loop
+            :param max_async_pool {int}: max async pool, this will define the number of processes to run at once
+            :param max_in_flight {int}: max number of futures to keep in flight at once; default: max_async_pool * 2
+            :param ordered {bool}: yield results in the order of the arguments; default: False
+            :param reorder_buffer {int}: max number of finished results held back to restore order; default: max_in_flight
+            :param executor {str}: 'thread' or 'process', use process for cpu bound functions; default: thread
+            :param chunksize {int}: number of arguments sent to a worker at once; default: 1 for thread, 64 for process
+            :param runner {AioRunner}: runner whose loop and warm executor are reused across calls; default: None
+            :param adaptive {Union[bool, AdaptiveLimit]}: adjust the number of futures in flight from latency and
+                failures, True uses an AdaptiveLimit up to max_async_pool; default: None
+            :param disable_progress_bar {bool}: disable progress bar from printing
+            :param progress_bar_color {str}: color of progress bar; default: green
+            :param progress_bar_format {str}: format for progress bar output; default: None
+
+            Examples:
+                @aiobulk
+                def add(x:int,y:int)->int:return x+y
+
+                args = ([x,y] for x in range(0,5000) for y in range(5,10))
+                for result in add.bulk_iter(args):
+                    print(result)
+
+            :return iterator of results, in the order they are finished unless ordered is set
+        """
+        if self.__self__ is not None:
+            args_iter = ([self.__self__] + list(args) for args in args_iter)
+        return aioloop_iter(self.__bound__, args_iter, loop=loop, max_async_pool=max_async_pool,
+                            max_in_flight=max_in_flight, ordered=ordered, reorder_buffer=reorder_buffer,
+                            executor=executor, chunksize=chunksize, runner=runner, adaptive=adaptive,
+                            disable_progress_bar=disable_progress_bar, progress_bar_color=progress_bar_color,
+                            progress_bar_format=progress_bar_format)
\ No newline at end of file
@@ -0,0 +1,461 @@
+import hashlib
+import heapq
+import mmap
+import os
+import tempfile
+
+from binascii import unhexlify
+from re import compile, Pattern
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Set, Union
+from requests import Response
+
+from modutils import sha256
+from modutils.aio import aioloop_iter
+from modutils.cache import FileHashCache
+
+DIGEST_SIZE = 32
+# the characters of sha256_pattern
+HEX_BYTES = b'0123456789abcdefABCDEF'
+HEX_PREFIX: Pattern = compile(rb'[A-Fa-f0-9]*')
+# hex bytes become h and every other byte a dot, so a hash is 64 h between dots
+HEX_MARK = ord('h')
+HEX_TABLE = bytes(HEX_MARK if byte in HEX_BYTES else ord('.') for byte in range(256))
+HEX_RUN = bytes([HEX_MARK]) * 64
+
+
+def _digest(value: Any) -> bytes:
+    """32 byte digest of a sha256 object or a value that converts to one"""
+    return value.digest if isinstance(value, sha256) else sha256(value).digest
+
+
+def _records(buffer: Union[bytes, mmap.mmap]) -> Iterator[bytes]:
+    """iterate the digests of a packed buffer"""
+    for offset in range(0, len(buffer), DIGEST_SIZE):
+        yield buffer[offset:offset + DIGEST_SIZE]
+
+
+def _unique(digests: Iterable[bytes]) -> Iterator[bytes]:
+    """drop repeats from sorted digests"""
+    previous = None
+    for digest in digests:
+        if digest != previous:
+            yield digest
+            previous = digest
+
+
+class Sha256Set(object):
+
+    def __init__(self, values: Iterable = (), path: str = None, run_size: int = 1 << 20):
+        """initialize Sha256Set
+        a frozen set of sha256 digests packed into one sorted buffer of 32 bytes per digest, a fraction of the memory
+        of a set of strings or sha256 objects
+        Ex.
+            allowed = Sha256Set(hashes, path='/data/allowed.sha256')
+            sha256(value) in allowed
+            allowed = Sha256Set.load('/data/allowed.sha256')
+
+        values are sorted in runs of run_size digests and the runs are merged, with path the runs and the result are
+        written to files and the result is memory mapped, so building needs memory for one run only.
+        Membership is an interpolation search, digests are uniformly distributed so a lookup reads a few digests,
+        bisecting whenever a step does not halve the range keeps the worst case logarithmic
+
+        :param values: sha256 objects, hex strings or 32 byte digests
+        :param path: file to write the packed digests to and map, see load; default None to keep them in memory
+        :param run_size: digests sorted in memory at a time; default 1048576
+        """
+        self.path = path
+        self._file = None
+        runs = []
+        try:
+            run = []
+            for value in values:
+                run.append(_digest(value))
+                if len(run) >= run_size:
+                    runs.append(self._run(run))
+                    run = []
+            if run or not runs:
+                runs.append(self._run(run))
+            merged = _unique(heapq.merge(*map(_records, runs))) if len(runs) > 1 else _records(runs[0])
+            if path is None:
+                self._buffer = b''.join(merged)
+            else:
+                with open(path, 'wb') as fout:
+                    for digest in merged:
+                        fout.write(digest)
+                self._map(path)
+        finally:
+            for run in runs:
+                if isinstance(run, mmap.mmap):
+                    run.close()
+
+    def _run(self, digests: List[bytes]) -> Union[bytes, mmap.mmap]:
+        """sort and pack a run of digests, it is spilled to a temporary file next to path if there is one"""
+        packed = b''.join(_unique(sorted(digests)))
+        if self.path is None or not packed:
+            return packed
+        with tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(self.path))) as fout:
+            fout.write(packed)
+            fout.flush()
+            return mmap.mmap(fout.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _map(self, path: str) -> None:
+        """map a file of packed digests"""
+        self.path = path
+        if not os.path.getsize(path):
+            self._buffer = b''
+            return
+        self._file = open(path, 'rb')
+        self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @classmethod
+    def load(cls, path: str, use_mmap: bool = True) -> 'Sha256Set':
+        """load a set saved with save or built with a path, the file is the sorted 32 byte digests and nothing else
+
+        :param path: file of packed digests
+        :param use_mmap: map the file instead of reading it into memory, pages are read as lookups need them;
+            default True
+        :return: Sha256Set
+        """
+        size = os.path.getsize(path)
+        if size % DIGEST_SIZE:
+            raise ValueError(f'{path!r} is not a file of {DIGEST_SIZE} byte digests')
+        digests = cls.__new__(cls)
+        digests.path = path
+        digests._file = None
+        if use_mmap:
+            digests._map(path)
+        else:
+            with open(path, 'rb') as fin:
+                digests._buffer = fin.read()
+        return digests
+
+    def save(self, path: str) -> None:
+        """write the packed digests to a file that load can map
+
+        :param path: file to write
+        """
+        with open(path, 'wb') as fout:
+            fout.write(self._buffer)
+
+    def close(self) -> None:
+        """unmap the file of the set, if it is mapped"""
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+            self._buffer = b''
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def nbytes(self) -> int:
+        """bytes of the packed digests"""
+        return len(self._buffer)
+
+    def __len__(self) -> int:
+        return len(self._buffer) // DIGEST_SIZE
+
+    def __iter__(self) -> Iterator[sha256]:
+        """sha256 objects in digest order"""
+        for digest in _records(self._buffer):
+            yield sha256(digest)
+
+    def __contains__(self, value: Any) -> bool:
+        try:
+            digest = _digest(value)
+        except TypeError:
+            return False
+        return self.index(digest) >= 0
+
+    def index(self, value: Any) -> int:
+        """position of a digest in the sorted set
+
+        :param value: sha256 object, hex string or 32 byte digest
+        :return: index of the digest, or -1 if it is not in the set
+        """
+        digest = _digest(value)
+        buffer = self._buffer
+        target = int.from_bytes(digest[:8], 'big')
+        # the first 8 bytes of every digest in [low, high) are between low_key and high_key
+        low, high = 0, len(buffer) // DIGEST_SIZE
+        low_key, high_key = 0, 1 << 64
+        interpolate = True
+        while low < high:
+            size = high - low
+            if interpolate and size > 8:
+                middle = low + (target - low_key) * size // (high_key - low_key + 1)
+                middle = min(max(middle, low), high - 1)
+            else:
+                middle = (low + high) // 2
+            record = buffer[middle * DIGEST_SIZE:(middle + 1) * DIGEST_SIZE]
+            if record < digest:
+                low, low_key = middle + 1, int.from_bytes(record[:8], 'big')
+            elif record > digest:
+                high, high_key = middle, int.from_bytes(record[:8], 'big')
+            else:
+                return middle
+            # bisect next if interpolating did not halve the range
+            interpolate = not interpolate or high - low <= size // 2
+        return -1
+
+    def __repr__(self):
+        return f'Sha256Set({len(self)} digests{f", path={self.path!r}" if self.path else ""})'
+
+
+def _hex_runs(buffer: Union[bytes, bytearray], limit: int) -> List[bytes]:
+    """runs of exactly 64 hex bytes in buffer[:limit], the start and limit of the buffer end a run"""
+    marked = buffer.translate(HEX_TABLE)
+    find = marked.find
+    runs = []
+    position = find(HEX_RUN, 0, limit)
+    while position >= 0:
+        # every search starts after a non-hex byte, so a run found starts there
+        end = position + 64
+        if end == limit or marked[end] != HEX_MARK:
+            runs.append(buffer[position:end])
+            position = find(HEX_RUN, end + 1, limit)
+            continue
+        end = find(b'.', end, limit)
+        if end < 0:
+            break
+        position = find(HEX_RUN, end + 1, limit)
+    return runs
+
+
+class Sha256Scanner(object):
+
+    def __init__(self, unique: bool = True):
+        """initialize Sha256Scanner
+        an incremental scanner for sha256 hashes in chunks of bytes, a hash is a run of exactly 64 hex characters
+        and a hash split across chunks is found once it is complete
+        Ex.
+            scanner = Sha256Scanner()
+            for chunk in chunks:
+                for hash in scanner.feed(chunk):
+                    ...
+            hashes = scanner.close()
+
+        hex bytes are mapped to one marker byte with bytes.translate and runs of 64 markers found with bytes.find,
+        which is faster than matching sha256_pattern with lookarounds. Only the trailing run of hex bytes of a chunk
+        is kept for the next one, at most 65 bytes
+
+        :param unique: skip hashes that were already found, in any case; default True
+        """
+        self.unique = unique
+        self.seen: Set[bytes] = set()
+        self._carry = b''
+
+    def hashes(self, runs: Iterable[bytes]) -> List[sha256]:
+        """sha256 objects of hex runs, without the ones already seen if unique"""
+        hashes = []
+        for run in runs:
+            digest = unhexlify(run)
+            if self.unique:
+                if digest in self.seen:
+                    continue
+                self.seen.add(digest)
+            hashes.append(sha256(digest))
+        return hashes
+
+    def feed(self, chunk: Union[bytes, bytearray, memoryview, str]) -> List[sha256]:
+        """scan the next chunk
+
+        :param chunk: next bytes of the stream, str is encoded to utf-8
+        :return: hashes completed by this chunk
+        """
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8', 'replace')
+        buffer = self._carry + chunk if self._carry else bytes(chunk)
+        end = len(buffer)
+        tail = buffer[-65:]
+        run = len(tail) - len(tail.rstrip(HEX_BYTES))
+        if run > 64:
+            # no hash ends in a run longer than a hash, 65 bytes of it keep the next chunk from matching the rest
+            self._carry = tail
+            return self.hashes(_hex_runs(buffer, end))
+        # a hash ending the chunk is only complete once the byte after it is known
+        self._carry = buffer[end - run:]
+        return self.hashes(_hex_runs(buffer, end - run))
+
+    def close(self) -> List[sha256]:
+        """scan the rest of the stream
+
+        :return: hashes completed by the end of the stream
+        """
+        buffer, self._carry = self._carry, b''
+        return self.hashes(_hex_runs(buffer, len(buffer)))
+
+
+def _scan_range(path: str, start: int, end: int, unique: bool, window: int) -> List[sha256]:
+    """hashes starting in a range of a file, runs inside a worker process"""
+    with open(path, 'rb') as fin, mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        # a run crossing the start belongs to the range before, one crossing the end is read to its end
+        if start and mapped[start - 1] in HEX_BYTES:
+            start = HEX_PREFIX.match(mapped, start).end()
+        if start < end and mapped[end - 1] in HEX_BYTES:
+            end = HEX_PREFIX.match(mapped, end, end + 65).end()
+        scanner = Sha256Scanner(unique)
+        hashes = []
+        for offset in range(start, end, window):
+            hashes.extend(scanner.feed(mapped[offset:min(offset + window, end)]))
+        hashes.extend(scanner.close())
+        return hashes
+
+
+def scan_sha256(source: Union[bytes, bytearray, memoryview, mmap.mmap, str, Response, BinaryIO, Iterable[bytes]],
+                unique: bool = True, chunk_size: int = 1024 * 1024) -> Iterator[sha256]:
+    """scan_sha256 - find the sha256 hashes in bytes, a memory mapped file, or a stream of chunks
+    Ex.
+        hashes = list(scan_sha256(data))
+        for hash in scan_sha256(session.get(feed_url, stream=True)):
+            ...
+
+    a hash is a run of exactly 64 hex characters, hex inside a longer run is not matched, see Sha256Scanner
+
+    :param source: bytes-like object, mmap or str scanned in windows of chunk_size, a response requested with
+        stream=True which is closed at the end, a binary file object, or an iterable of bytes chunks
+    :param unique: yield every hash once, in any case; default True
+    :param chunk_size: bytes scanned or read at a time; default 1MB
+    :return: iterator of sha256 in the order they are found
+    """
+    scanner = Sha256Scanner(unique)
+    if isinstance(source, (bytes, bytearray, memoryview, mmap.mmap, str)):
+        chunks = (source[offset:offset + chunk_size] for offset in range(0, len(source), chunk_size))
+    elif isinstance(source, Response):
+        chunks = source.iter_content(chunk_size)
+    elif hasattr(source, 'read'):
+        chunks = iter(lambda: source.read(chunk_size), b'')
+    else:
+        chunks = source
+    try:
+        for chunk in chunks:
+            yield from scanner.feed(chunk)
+        yield from scanner.close()
+    finally:
+        if isinstance(source, Response):
+            source.close()
+
+
+def scan_sha256_file(path: str, unique: bool = True, processes: int = None, chunk_size: int = 1024 * 1024,
+                     range_size: int = 64 * 1024 * 1024) -> Iterator[sha256]:
+    """scan_sha256_file - find the sha256 hashes in a memory mapped file, optionally split across worker processes
+    Ex.
+        hashes = set(scan_sha256_file('/var/log/feed.log', processes=8))
+
+    :param path: file to scan
+    :param unique: yield every hash once, in any case; default True
+    :param processes: number of worker processes scanning ranges of range_size bytes, None scans in this process;
+        default None
+    :param chunk_size: bytes scanned at a time; default 1MB
+    :param range_size: bytes of the range of the file scanned by a worker; default 64MB
+    :return: iterator of sha256 in the order they are found
+    """
+    size = os.path.getsize(path)
+    if not size:
+        return
+    if not processes or size <= range_size:
+        with open(path, 'rb') as fin, mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield from scan_sha256(mapped, unique, chunk_size)
+        return
+    seen = set()
+    ranges = [[path, start, min(start + range_size, size), unique, chunk_size] for start in range(0, size, range_size)]
+    for hashes in aioloop_iter(_scan_range, ranges, max_async_pool=processes, ordered=True, executor='process',
+                               chunksize=1, disable_progress_bar=True):
+        for hash in hashes:
+            if unique:
+                if hash.digest in seen:
+                    continue
+                seen.add(hash.digest)
+            yield hash
+
+
+def hash_file(path: str, chunk_size: int = 4 * 1024 * 1024, use_mmap: bool = False) -> sha256:
+    """hash_file - compute the sha256 of a file
+    Ex.
+        digest = hash_file('/artifacts/build.tar.gz')
+
+    the file is read into one reused buffer of chunk_size bytes, or memory mapped and hashed in a single update.
+    hashlib releases the GIL while it hashes large buffers, so files can be hashed in parallel by threads
+
+    :param path: file to hash
+    :param chunk_size: bytes read at a time; default 4MB
+    :param use_mmap: map the file instead of reading it; default False
+    :return: sha256
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fin:
+        if use_mmap and os.fstat(fin.fileno()).st_size:
+            with mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                digest.update(mapped)
+        else:
+            buffer = memoryview(bytearray(chunk_size))
+            while True:
+                read = fin.readinto(buffer)
+                if not read:
+                    break
+                digest.update(buffer[:read])
+    return sha256(digest.digest())
+
+
+def _file_paths(paths: Union[str, os.PathLike, Iterable[Union[str, os.PathLike]]]) -> Iterator[str]:
+    """files of a path or of an iterable of paths, directories are walked in sorted order"""
+    for path in [paths] if isinstance(paths, (str, os.PathLike)) else paths:
+        path = os.fspath(path)
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, directories, files in os.walk(path):
+            directories.sort()
+            for name in sorted(files):
+                yield os.path.join(root, name)
+
+
+def hash_files(paths: Union[str, os.PathLike, Iterable[Union[str, os.PathLike]]], max_workers: int = 8,
+               executor: str = 'thread', chunk_size: int = 4 * 1024 * 1024, use_mmap: bool = False,
+               cache: FileHashCache = None, disable_progress_bar: bool = True) -> Dict[str, sha256]:
+    """hash_files - compute the sha256 of files, directory trees or an iterable of paths in parallel
+    Ex.
+        cache = FileHashCache('/var/cache/artifacts.json')
+        digests = hash_files('/artifacts', cache=cache)
+
+    files are hashed with hash_file through aioloop_iter, with a cache only files whose size or mtime changed since
+    they were cached are read, and the cache is saved at the end if it has a path
+
+    :param paths: file, directory walked for every file under it, or iterable of files and directories
+    :param max_workers: number of files hashed at once; default 8
+    :param executor: 'thread' or 'process', threads hash in parallel since hashlib releases the GIL; default thread
+    :param chunk_size: bytes read at a time, see hash_file; default 4MB
+    :param use_mmap: map files instead of reading them, see hash_file; default False
+    :param cache: cache of digests by path, size and mtime; default None
+    :param disable_progress_bar: disable progress bar from printing; default True
+    :return: dict of path to sha256, in the order of paths
+    """
+    digests = {}
+    changed = []
+    for path in _file_paths(paths):
+        if path in digests:
+            continue
+        digests[path] = None
+        if cache is not None:
+            stat = os.stat(path)
+            digest = cache.get(path, stat)
+            if digest is not None:
+                digests[path] = sha256(digest)
+                continue
+            changed.append((path, stat))
+        else:
+            changed.append((path, None))
+    results = aioloop_iter(hash_file, [[path, chunk_size, use_mmap] for path, _ in changed], ordered=True,
+                           max_async_pool=max_workers, executor=executor, disable_progress_bar=disable_progress_bar)
+    for (path, stat), digest in zip(changed, results):
+        digests[path] = digest
+        if cache is not None:
+            cache.set(path, stat, digest.digest)
+    if cache is not None:
+        cache.save()
+    return digests
@@ -0,0 +1,140 @@
+import codecs
+
+from html.parser import HTMLParser
+from re import compile, IGNORECASE
+from typing import List, Union
+
+# text inside these tags is not part of BeautifulSoup.stripped_strings with html.parser
+EXCLUDED_STRING_TAGS = frozenset(['script', 'style', 'template', 'rt', 'rp'])
+# tags closed as soon as they are opened
+VOID_TAGS = frozenset(['area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed', 'frame', 'hr',
+                       'image', 'img', 'input', 'isindex', 'keygen', 'link', 'menuitem', 'meta', 'nextid', 'param',
+                       'source', 'spacer', 'track', 'wbr'])
+
+META_CHARSET_PATTERN = compile(rb'<meta[^>]+charset=["\']?([A-Za-z0-9_.:-]+)', IGNORECASE)
+
+
+class HTMLTextParser(HTMLParser):
+
+    def __init__(self, collect_links: bool = False):
+        """initialize HTMLTextParser
+        an incremental parser that yields the same strings as BeautifulSoup(html, 'html.parser').stripped_strings
+        without building a tree, text is kept only until it is returned by feed_strings
+
+        Ex.
+            parser = HTMLTextParser()
+            for chunk in chunks:
+                for text in parser.feed_strings(chunk):
+                    ...
+            strings = parser.close_strings()
+
+        :param collect_links: keep the href of every anchor in links; default False
+        """
+        super().__init__(convert_charrefs=True)
+        self.collect_links = collect_links
+        self.links: List[str] = []
+        self._strings: List[str] = []
+        self._data: List[str] = []
+        self._open: List[str] = []
+        self._excluded = 0
+
+    def _flush(self) -> None:
+        """end the current string, it is kept if it is not inside an excluded tag or blank"""
+        if self._data:
+            text = ''.join(self._data).strip()
+            self._data = []
+            if text and not self._excluded:
+                self._strings.append(text)
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        self._flush()
+        if tag not in VOID_TAGS:
+            self._open.append(tag)
+            self._excluded += tag in EXCLUDED_STRING_TAGS
+        if self.collect_links and tag == 'a':
+            self._link(attrs)
+
+    def handle_startendtag(self, tag: str, attrs: list) -> None:
+        self._flush()
+        if self.collect_links and tag == 'a':
+            self._link(attrs)
+
+    def handle_endtag(self, tag: str) -> None:
+        self._flush()
+        # like BeautifulSoup, an end tag closes every tag opened after the last open tag of its name
+        if tag in self._open:
+            while True:
+                closed = self._open.pop()
+                self._excluded -= closed in EXCLUDED_STRING_TAGS
+                if closed == tag:
+                    break
+
+    def handle_data(self, data: str) -> None:
+        self._data.append(data)
+
+    def handle_comment(self, data: str) -> None:
+        self._flush()
+
+    def handle_decl(self, decl: str) -> None:
+        self._flush()
+
+    def handle_pi(self, data: str) -> None:
+        self._flush()
+
+    def unknown_decl(self, data: str) -> None:
+        self._flush()
+        if data.startswith('CDATA['):
+            text = data[len('CDATA['):].strip()
+            if text:
+                self._strings.append(text)
+
+    def _link(self, attrs: list) -> None:
+        """keep the href of an anchor"""
+        for name, value in attrs:
+            if name == 'href' and value is not None:
+                self.links.append(value)
+                break
+
+    def feed_strings(self, data: str) -> List[str]:
+        """parse more of the document
+
+        :param data: next part of the document
+
+        :return: strings completed by this part
+        """
+        self.feed(data)
+        strings, self._strings = self._strings, []
+        return strings
+
+    def close_strings(self) -> List[str]:
+        """parse the rest of the document
+
+        :return: strings completed by the end of the document
+        """
+        self.close()
+        self._flush()
+        strings, self._strings = self._strings, []
+        return strings
+
+
+def incremental_decoder(content_type: Union[str, None], head: bytes) -> codecs.IncrementalDecoder:
+    """decoder for an html document, from the charset of its Content-Type header, or of a meta tag in its first
+    bytes, or utf-8
+
+    :param content_type: value of the Content-Type header
+    :param head: first bytes of the document
+
+    :return: incremental decoder replacing invalid bytes
+    """
+    encoding = None
+    for parameter in (content_type or '').split(';')[1:]:
+        name, _, value = parameter.strip().partition('=')
+        if name.lower() == 'charset':
+            encoding = value.strip('"\'')
+    if encoding is None:
+        match = META_CHARSET_PATTERN.search(head)
+        encoding = match.group(1).decode('ascii') if match else 'utf-8'
+    try:
+        return codecs.getincrementaldecoder(encoding)(errors='replace')
+    except LookupError:
+        return codecs.getincrementaldecoder('utf-8')(errors='replace')
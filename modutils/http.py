@@ -1,29 +1,298 @@
+import asyncio
 import logging
+import mmap
+import os
 
+from collections import OrderedDict, deque
+from concurrent.futures import Future
 from functools import partial
-from requests import Session, Response
+from hashlib import sha256 as sha256_hash
+from json import dumps
+from requests import Request, Session, Response
 from requests.auth import HTTPBasicAuth
 from requests.adapters import HTTPAdapter
-from email.mime.application import MIMEApplication
-from email.mime.image import MIMEImage
+from requests.exceptions import RequestException
+from urllib3.util.retry import Retry
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from email.utils import formatdate
-from os.path import basename
-from smtplib import SMTP
-from typing import Union, Text
+from email.utils import formatdate, parsedate_to_datetime
+from random import uniform
+from uuid import uuid4
+from smtplib import SMTP, SMTPException, SMTPRecipientsRefused, SMTPServerDisconnected
+from queue import LifoQueue
+from threading import BoundedSemaphore, Lock
+from time import monotonic, sleep, time
+from typing import Any, Callable, Iterable, Iterator, List, Tuple, Union, Text
 from bs4 import BeautifulSoup
-from re import findall
+from bs4.builder import ParserRejectedMarkup
+from re import compile
+from urllib.parse import urldefrag, urljoin, urlsplit
 
+from modutils.aio import AioRunner, _split_args, aioloop, aioloop_iter
+from modutils.aioengine import AsyncHTTPEngine
+from modutils.cache import AttachmentCache, ResponseCache
 from modutils.decorators import aiobulk
+from modutils.htmltext import HTMLTextParser, incremental_decoder
+from modutils.logs import RequestLog, queue_logger
+from modutils.metrics import ATTEMPT_BUCKETS, MetricsRegistry
+from modutils.patterns import PatternSet
+
+ENGINES = ('requests', 'asyncio')
+SAFE_METHODS = frozenset(['GET', 'HEAD'])
+
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'TRACE', 'PUT', 'DELETE'])
+
+
+class RetryPolicy(object):
+
+    def __init__(self, max_retries: int = 3, backoff_base: float = 0.1, backoff_max: float = 30.0,
+                 max_retry_time: float = 60.0, respect_retry_after: bool = True, budget_ratio: float = 0.2,
+                 budget_retries: int = 10, budget_max_retries: int = 100,
+                 non_idempotent_status_codes: Iterable = (429, 503)):
+        """initialize RetryPolicy
+        exponential backoff with full jitter and a retry budget shared by every request of a session
+
+        the budget starts with budget_retries tokens, every request adds budget_ratio tokens up to
+        budget_max_retries and every retry spends one, so once the starting tokens are spent retries can never be
+        more than budget_ratio of the requests sent
+
+        idempotent methods are retried on any status code that is not resolved, non idempotent methods (post,
+        patch) are only retried on non_idempotent_status_codes where the server did not act on the request
+
+        :param max_retries: maximum amount of retries of a single request; default 3
+        :param backoff_base: seconds of the first backoff, doubled every retry; default 0.1
+        :param backoff_max: maximum seconds of a single backoff, a request whose Retry-After is longer is not
+            retried; default 30.0
+        :param max_retry_time: maximum seconds spent on a single request, retries stop once it would be passed;
+            default 60.0
+        :param respect_retry_after: wait as long as the Retry-After header asks for; default True
+        :param budget_ratio: tokens added to the shared retry budget by every request, None to disable; default 0.2
+        :param budget_retries: tokens the retry budget starts with; default 10
+        :param budget_max_retries: most tokens the retry budget can hold; default 100
+        :param non_idempotent_status_codes: status codes non idempotent methods are retried on; default (429, 503)
+        """
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_time = max_retry_time
+        self.respect_retry_after = respect_retry_after
+        self.budget_ratio = budget_ratio
+        self.budget_max_retries = budget_max_retries
+        self.non_idempotent_status_codes = frozenset(non_idempotent_status_codes)
+        self._budget = float(budget_retries)
+        self._lock = Lock()
+
+    def deposit(self) -> None:
+        """add the tokens of a new request to the retry budget"""
+        if self.budget_ratio is None:
+            return
+        with self._lock:
+            self._budget = min(self._budget + self.budget_ratio, self.budget_max_retries)
+
+    def _withdraw(self) -> bool:
+        """spend a token of the retry budget
+
+        :return: True if a token was available
+        """
+        if self.budget_ratio is None:
+            return True
+        with self._lock:
+            if self._budget < 1:
+                return False
+            self._budget -= 1
+            return True
+
+    def retry_after(self, response: Response) -> Union[float, None]:
+        """seconds asked for by the Retry-After header of a response
+
+        :param response: response to read the header from
+
+        :return: seconds to wait or None if the header is missing or invalid
+        """
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+    def backoff(self, attempt: int, response: Response = None) -> float:
+        """seconds to wait before a retry
+
+        :param attempt: number of the attempt that just failed, starting at 1
+        :param response: response of the failed attempt; default None
+
+        :return: Retry-After if respected and set, it can be more than backoff_max, otherwise a random time between
+            0 and the exponential backoff
+        """
+        if self.respect_retry_after and response is not None:
+            retry_after = self.retry_after(response)
+            if retry_after is not None:
+                return retry_after
+        return uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    def next_delay(self, method: str, attempt: int, response: Response, elapsed: float) -> Union[float, None]:
+        """decide if a failed attempt should be retried
+
+        :param method: http method of the request, None is treated as idempotent
+        :param attempt: number of the attempt that just failed, starting at 1
+        :param response: response of the failed attempt
+        :param elapsed: seconds spent on the request so far
+
+        :return: seconds to wait before retrying or None if the request should not be retried, also when the server
+            asks to wait longer than backoff_max or past max_retry_time
+        """
+        if attempt > self.max_retries:
+            return None
+        if method is not None and method.upper() not in IDEMPOTENT_METHODS and \
+                response.status_code not in self.non_idempotent_status_codes:
+            return None
+        delay = self.backoff(attempt, response)
+        if delay > self.backoff_max:
+            return None
+        if self.max_retry_time is not None and elapsed + delay > self.max_retry_time:
+            return None
+        if not self._withdraw():
+            return None
+        return delay
+
+
+class TokenBucket(object):
+
+    def __init__(self, rate: float, capacity: float = None):
+        """initialize TokenBucket
+        a thread safe token bucket, tokens refill at rate per second up to capacity
+
+        :param rate: tokens added per second, the allowed number of requests per second
+        :param capacity: most tokens the bucket can hold, the allowed burst; default rate, at least 1
+        """
+        if rate <= 0:
+            raise ValueError(f'{"rate"!r} must be greater than 0')
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity is not None else max(self.rate, 1.0)
+        self._tokens = self.capacity
+        self._last = monotonic()
+        self._lock = Lock()
+
+    def reserve(self, tokens: float = 1) -> float:
+        """take tokens from the bucket without waiting for them
+
+        tokens are reserved before waiting so waiting callers are served in the order they arrived
+
+        :param tokens: number of tokens to take; default 1
+
+        :return: seconds to wait before the tokens are available
+        """
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= tokens
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def acquire(self, tokens: float = 1) -> float:
+        """take tokens from the bucket, sleeping until they are available
+
+        :param tokens: number of tokens to take; default 1
+
+        :return: seconds slept
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            sleep(wait)
+        return wait
+
+
+class RateLimiter(object):
+
+    def __init__(self, limits: dict = None, default_rate: float = None, default_capacity: float = None):
+        """initialize RateLimiter
+        a token bucket per host or url prefix, shared by every request of a session
+
+        Ex.
+            RateLimiter({'api.partner.com': 10, 'https://api.other.com/v2/': (5, 20)}, default_rate=50)
+
+        :param limits: dict of host, host:port, or url prefix to a rate or a (rate, capacity) tuple, url prefixes
+            must include the scheme and the longest matching prefix wins over a host; default None
+        :param default_rate: rate of every other host, each host gets its own bucket, None to not limit; default None
+        :param default_capacity: capacity of the default buckets; default default_rate
+        """
+        self._prefixes = []
+        self._hosts = {}
+        for key, limit in (limits or {}).items():
+            bucket = TokenBucket(*limit) if isinstance(limit, (tuple, list)) else TokenBucket(limit)
+            if '://' in key:
+                self._prefixes.append((key, bucket))
+            else:
+                self._hosts[key.lower()] = bucket
+        self._prefixes.sort(key=lambda prefix: len(prefix[0]), reverse=True)
+        self.default_rate = default_rate
+        self.default_capacity = default_capacity
+        self._lock = Lock()
+
+    def bucket(self, url: Union[Text, bytes]) -> Union[TokenBucket, None]:
+        """find the bucket of a url
+
+        :param url: url of the request
+
+        :return: bucket of the url or None if it is not limited
+        """
+        if isinstance(url, bytes):
+            url = url.decode('utf-8')
+        for prefix, bucket in self._prefixes:
+            if url.startswith(prefix):
+                return bucket
+        parts = urlsplit(url)
+        netloc = parts.netloc.lower()
+        bucket = self._hosts.get(netloc) or self._hosts.get(parts.hostname or '')
+        if bucket is None and self.default_rate is not None:
+            with self._lock:
+                bucket = self._hosts.get(netloc)
+                if bucket is None:
+                    bucket = self._hosts[netloc] = TokenBucket(self.default_rate, self.default_capacity)
+        return bucket
+
+    def reserve(self, url: Union[Text, bytes]) -> float:
+        """take a token of the bucket of a url without waiting for it
+
+        :param url: url of the request
+
+        :return: seconds to wait before the token is available
+        """
+        bucket = self.bucket(url)
+        return bucket.reserve() if bucket is not None else 0.0
+
+    def acquire(self, url: Union[Text, bytes]) -> float:
+        """wait for a token of the bucket of a url
+
+        :param url: url of the request
+
+        :return: seconds slept
+        """
+        bucket = self.bucket(url)
+        return bucket.acquire() if bucket is not None else 0.0
 
 
 class BaseSession(Session):
     retries: int
     verbose: bool
+    retry_policy: RetryPolicy
+    rate_limiter: Union[RateLimiter, None]
+    cache: Union[ResponseCache, None]
+    request_log: RequestLog
+    metrics: Union[MetricsRegistry, None]
 
     def __init__(self, max_retries: int = 3, pool_connections: int = 16, pool_maxsize: int = 16,
-                 resolve_status_codes: list = None, verbose: bool = False, auth: tuple = None):
+                 resolve_status_codes: list = None, verbose: bool = False, auth: tuple = None,
+                 retry_policy: RetryPolicy = None, rate_limits: Union[dict, RateLimiter] = None,
+                 cache: Union[bool, ResponseCache] = None, request_log: RequestLog = None,
+                 metrics: Union[bool, MetricsRegistry] = None):
         """initialize BaseSession
 
         :param max_retries: maximum amount of retries if non resolved status code found
@@ -32,13 +301,28 @@ class BaseSession(Session):
         :param resolve_status_codes: extra status codes to resolve; default None
         :param verbose: more verbose logging output if response fails; default False
         :param auth: basic auth username and password tuple; default None
+        :param retry_policy: backoff, Retry-After and retry budget policy for resolving requests;
+            default RetryPolicy(max_retries)
+        :param rate_limits: RateLimiter or dict of host or url prefix to requests per second, every request and
+            retry waits for a token of its host; default None
+        :param cache: ResponseCache, or True for an in-memory ResponseCache, used by get to reuse fresh responses
+            and revalidate stale ones with ETag and Last-Modified; default None
+        :param request_log: RequestLog responses are logged with, sampling and writing happen off the request
+            thread; default RequestLog()
+        :param metrics: MetricsRegistry, or True for a new one, recording latency, attempts, bytes and requests in
+            flight by host, method and status class, and the usage of the connection pools; default None
         """
         super().__init__()
+        self.retries = max_retries
+        self.retry_policy = retry_policy or RetryPolicy(max_retries=max_retries)
+        self.rate_limiter = RateLimiter(rate_limits) if isinstance(rate_limits, dict) else rate_limits
+        self.cache = ResponseCache() if cache is True else cache or None
+        # status codes are resolved by the retry policy, urllib3 only retries connection errors
         adapters = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
-                                    max_retries=max_retries)
+                               max_retries=Retry(total=max_retries, backoff_factor=self.retry_policy.backoff_base,
+                                                 respect_retry_after_header=False))
         self.mount("https://", adapters)
         self.mount('http://', adapters)
-        self.retries = max_retries
         self.verbose = verbose
         self.resolve_status_codes = [200, 201, 202, 203, 204, 205, 206, 207, 208, 226, 400, 401, 404]
         if isinstance(resolve_status_codes, int):
@@ -47,44 +331,162 @@ class BaseSession(Session):
             for sc in resolve_status_codes:
                 if isinstance(sc, int):
                     self.resolve_status_codes.append(sc)
+        if self.cache is not None:
+            self.resolve_status_codes.append(304)
 
         if auth:
             self.auth = HTTPBasicAuth(*auth)
 
-        logging.basicConfig(
-            level=logging.INFO,
-            format='[%(asctime)s] %(levelname)s - %(message)s',
-            datefmt='%H:%M:%S'
-        )
-        self.session_logger = logging.getLogger(name='BaseSession')
-        self._log_msg_fmt = '{method}, {scheme}, {host}, {path}, {content_size}, {user_agent}, {status_code}'
+        self.request_log = request_log or RequestLog()
+        self.session_logger = self.request_log.logger
+        self._log_msg_fmt = '%(method)s, %(scheme)s, %(host)s, %(path)s, %(content_size)s, %(user_agent)s, ' \
+                            '%(status_code)s'
+        if self.cache is not None:
+            self._log_msg_fmt += ', cache %(cache_status)s (hits: %(cache_hits)s, misses: %(cache_misses)s)'
+
+        self.metrics = MetricsRegistry() if metrics is True else metrics or None
+        if self.metrics is not None:
+            self.metrics.register('http_pool_connections_in_use',
+                                  lambda: [(labels, in_use) for labels, in_use, _ in self.pool_usage()])
+            self.metrics.register('http_pool_maxsize',
+                                  lambda: [(labels, maxsize) for labels, _, maxsize in self.pool_usage()])
 
+    def pool_usage(self) -> List[tuple]:
+        """usage of the connection pools of the requests adapters
+
+        :return: list of (labels, connections in use, max connections) for every pool
+        """
+        usage = []
+        for adapter in {id(adapter): adapter for adapter in self.adapters.values()}.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    labels = (('host', f'{pool.host}:{pool.port}'), ('scheme', pool.scheme))
+                    usage.append((labels, pool.pool.maxsize - pool.pool.qsize(), pool.pool.maxsize))
+        return usage
+
+    def record_response(self, method: Union[str, None], response: Response, attempts: int,
+                        duration: float) -> None:
+        """record the metrics of a resolved request
+
+        :param method: http method of the request, default the method of response.request
+        :param response: resolved response
+        :param attempts: number of attempts sent
+        :param duration: seconds spent resolving the request
+        """
+        metrics = self.metrics
+        host = urlsplit(response.url).netloc
+        method = (method or response.request.method).upper()
+        labels = (('host', host), ('method', method))
+        status_labels = labels + (('status_class', f'{response.status_code // 100}xx'),)
+        metrics.inc('http_requests_total', status_labels)
+        metrics.observe('http_request_duration_seconds', duration, status_labels)
+        metrics.observe('http_request_attempts', attempts, labels, buckets=ATTEMPT_BUCKETS)
+        if attempts > 1:
+            metrics.inc('http_retries_total', labels, attempts - 1)
+        size = content_size(response)
+        if isinstance(size, int):
+            metrics.inc('http_response_bytes_total', labels, size)
+        body = response.request.body if response.request is not None else None
+        if isinstance(body, (bytes, str)):
+            metrics.inc('http_request_bytes_total', labels, len(body))
 
     def log_response(self, response: Response) -> None:
-        """log each requests/response from resolver"""
-        self.session_logger.info(self._log_msg_fmt.format(
-            scheme=response.url.split("://")[0], host=response.url.split('/')[2], method=response.request.method,
-            path=response.request.path_url, status_code=response.status_code, content_size=len(response.content),
-            user_agent=response.request.headers.get("User-Agent", "Unknown")))
-        if response.status_code >= 300 and self.verbose:
-            self.session_logger.error(f'RESPONSE: {response.text}')
-
-    def session_request(self, request: partial) -> Response:
+        """log each requests/response from resolver, nothing is built if the response is not sampled"""
+        if not self.request_log.enabled() or not self.request_log.sampled(response.status_code):
+            return
+        request = response.request
+        parts = urlsplit(response.url)
+        fields = {'method': request.method, 'scheme': parts.scheme, 'host': parts.netloc,
+                  'path': f'{parts.path or "/"}?{parts.query}' if parts.query else parts.path or '/',
+                  'content_size': content_size(response), 'user_agent': request.headers.get('User-Agent', 'Unknown'),
+                  'status_code': response.status_code}
+        if self.cache is not None:
+            fields.update(cache_status=getattr(response, 'cache_status', 'none'), cache_hits=self.cache.hits,
+                          cache_misses=self.cache.misses)
+        self.request_log.log(logging.INFO, self._log_msg_fmt, fields)
+        if response.status_code >= 300 and self.verbose and response._content_consumed \
+                and self.request_log.enabled(logging.ERROR):
+            self.request_log.log(logging.ERROR, 'RESPONSE: %(text)s', {'text': response.text})
+
+    def session_request(self, request: partial, method: str = None, url: Union[Text, bytes] = None,
+                        log: bool = True) -> Response:
         """attempt to resolve a requests with an invalid status code
 
         if the status code of the requests is not one to resolve:
             Default:  [200, 201, 202, 203, 204, 205, 206, 207, 208, 226, 400, 401, 404]
-        the requests will be sent up to max_retries or until receiving an accepted status_code
+        the requests will be sent again, after the backoff of the retry policy, until receiving an accepted
+        status_code or until the retry policy gives up
 
         :param request: partial requests function to be used to attempt and resolve a valid response
+        :param method: http method of the request, used to only retry non idempotent methods when safe; default None
+        :param url: url of the request, used to wait for the rate limit of its host; default None
+        :param log: log the resolved response; default True
 
         :return: response from the requests
         """
+        self.retry_policy.deposit()
+        start = monotonic()
         attempt = 1
-        resp = request()
-        while attempt <= self.retries and resp.status_code not in self.resolve_status_codes:
+        if self.metrics is not None:
+            self.metrics.add('http_requests_in_flight')
+        try:
+            if self.rate_limiter is not None and url is not None:
+                self.rate_limiter.acquire(url)
             resp = request()
-            attempt += 1
+            while resp.status_code not in self.resolve_status_codes:
+                delay = self.retry_policy.next_delay(method, attempt, resp, monotonic() - start)
+                if delay is None:
+                    break
+                resp.close()
+                sleep(delay)
+                if self.rate_limiter is not None and url is not None:
+                    self.rate_limiter.acquire(url)
+                resp = request()
+                attempt += 1
+        finally:
+            if self.metrics is not None:
+                self.metrics.add('http_requests_in_flight', value=-1)
+        if self.metrics is not None:
+            self.record_response(method, resp, attempt, monotonic() - start)
+        if log:
+            self.log_response(resp)
+        return resp
+
+    def cached_get(self, url: Union[Text, bytes], **kwargs) -> Response:
+        """get with the response cache, fresh responses are returned without a request and stale ones are
+        revalidated with a conditional request
+
+        :param url: url for requests
+        :param kwargs: named arguments for requests
+
+        :return: response from the cache or from requests, cache_status is set to hit, revalidated or miss
+        """
+        prepared = self.prepare_request(Request('GET', url, params=kwargs.get('params'),
+                                                headers=kwargs.get('headers'), cookies=kwargs.get('cookies'),
+                                                auth=kwargs.get('auth')))
+        key = f'GET {prepared.url}'
+        for name in ('Authorization', 'Cookie'):
+            # responses to different credentials are kept apart, without writing the credentials to the disk tier
+            if name in prepared.headers:
+                key += f' {name.lower()}:{sha256_hash(prepared.headers[name].encode("utf-8")).hexdigest()}'
+        entry = self.cache.get(key, prepared.headers)
+        if entry is not None and entry.fresh:
+            resp = entry.to_response(prepared)
+            resp.cache_status = 'hit'
+            self.log_response(resp)
+            return resp
+        if entry is not None:
+            kwargs['headers'] = dict(kwargs.get('headers') or {}, **entry.validators())
+        resp = self.session_request(partial(super(BaseSession, self).get, url, **kwargs), 'GET', url, log=False)
+        if entry is not None and resp.status_code == 304:
+            request = resp.request
+            resp = self.cache.revalidate(key, entry, resp).to_response(request)
+            resp.cache_status = 'revalidated'
+        else:
+            self.cache.store(key, resp)
+            resp.cache_status = 'miss'
         self.log_response(resp)
         return resp
 
@@ -97,7 +499,9 @@ class BaseSession(Session):
 
         :return: response from requests
         """
-        return self.session_request(partial(super(BaseSession, self).get, url, **kwargs))
+        if self.cache is not None and not kwargs.get('stream'):
+            return self.cached_get(url, **kwargs)
+        return self.session_request(partial(super(BaseSession, self).get, url, **kwargs), 'GET', url)
 
     def head(self, url: Union[Text, bytes], **kwargs) -> Response:
         """ override of requests.Session head
@@ -108,7 +512,7 @@ class BaseSession(Session):
 
         :return: response from requests
         """
-        return self.session_request(partial(super(BaseSession, self).head, url, **kwargs))
+        return self.session_request(partial(super(BaseSession, self).head, url, **kwargs), 'HEAD', url)
 
     def delete(self, url: Union[Text, bytes], **kwargs) -> Response:
         """ override of requests.Session delete
@@ -119,7 +523,7 @@ class BaseSession(Session):
 
         :return: response from requests
         """
-        return self.session_request(partial(super(BaseSession, self).delete, url, **kwargs))
+        return self.session_request(partial(super(BaseSession, self).delete, url, **kwargs), 'DELETE', url)
 
     def patch(self, url: Union[Text, bytes], **kwargs) -> Response:
         """ override of requests.Session patch
@@ -130,7 +534,7 @@ class BaseSession(Session):
 
         :return: response from requests
         """
-        return self.session_request(partial(super(BaseSession, self).patch, url, **kwargs))
+        return self.session_request(partial(super(BaseSession, self).patch, url, **kwargs), 'PATCH', url)
 
     def post(self, url: Union[Text, bytes], **kwargs) -> Response:
         """ override of requests.Session post
@@ -141,7 +545,7 @@ class BaseSession(Session):
 
         :return: response from requests
         """
-        return self.session_request(partial(super(BaseSession, self).post, url, **kwargs))
+        return self.session_request(partial(super(BaseSession, self).post, url, **kwargs), 'POST', url)
 
     def put(self, url: Union[Text, bytes], **kwargs) -> Response:
         """ override of requests.Session put
@@ -152,25 +556,316 @@ class BaseSession(Session):
 
         :return: response from requests
         """
-        return self.session_request(partial(super(BaseSession, self).put, url, **kwargs))
+        return self.session_request(partial(super(BaseSession, self).put, url, **kwargs), 'PUT', url)
+
+    def download(self, url: Union[Text, bytes], path: str, chunk_size: int = 1024 * 1024, preallocate: bool = False,
+                 use_mmap: bool = False, **kwargs) -> Response:
+        """stream a get response body straight to a file, at most chunk_size bytes are held in memory
+
+        the body is only written for 2xx responses, the response is closed and logged with the bytes written
+
+        :param url: url for requests
+        :param path: file to write the body to
+        :param chunk_size: bytes read and written at a time; default 1MB
+        :param preallocate: reserve Content-Length bytes on disk before writing; default False
+        :param use_mmap: write into a memory-mapped file of Content-Length bytes, falls back to regular writes
+            without a Content-Length; default False
+        :param kwargs: named arguments for requests
+
+        :return: response from requests, bytes_written is set to the bytes written to path
+        """
+        kwargs['stream'] = True
+        resp = self.session_request(partial(super(BaseSession, self).get, url, **kwargs), 'GET', url, log=False)
+        written = 0
+        try:
+            if 200 <= resp.status_code < 300:
+                size = int(resp.headers.get('Content-Length', 0)) if 'Content-Encoding' not in resp.headers else 0
+                with open(path, 'w+b') as fout:
+                    if use_mmap and size:
+                        fout.truncate(size)
+                        with mmap.mmap(fout.fileno(), size) as mapped:
+                            for chunk in resp.iter_content(chunk_size):
+                                if written + len(chunk) > size:
+                                    raise IOError(f'{url!r} sent more than its Content-Length of {size} bytes')
+                                mapped[written:written + len(chunk)] = chunk
+                                written += len(chunk)
+                            mapped.flush()
+                    else:
+                        if preallocate and size:
+                            _preallocate(fout, size)
+                        for chunk in resp.iter_content(chunk_size):
+                            fout.write(chunk)
+                            written += len(chunk)
+                    if written != size:
+                        fout.truncate(written)
+        finally:
+            resp.close()
+        resp.bytes_written = written
+        self.log_response(resp)
+        return resp
+
+
+def content_size(response: Response) -> Union[int, str]:
+    """size of a response body without reading a streamed body into memory
+
+    :param response: response to measure
+
+    :return: length of the read content, bytes written by download, the Content-Length header, or 'stream'
+    """
+    if response._content_consumed and response._content is not False:
+        return len(response._content or b'')
+    if hasattr(response, 'bytes_written'):
+        return response.bytes_written
+    return int(response.headers['Content-Length']) if 'Content-Length' in response.headers else 'stream'
+
+
+def _preallocate(fout, size: int) -> None:
+    """reserve size bytes on disk for a file
+
+    :param fout: file open for writing
+    :param size: bytes to reserve
+    """
+    if hasattr(os, 'posix_fallocate'):
+        os.posix_fallocate(fout.fileno(), 0, size)
+    else:
+        fout.truncate(size)
+
+
+def request_key(method: str, url: Union[Text, bytes], kwargs: dict) -> str:
+    """key identifying identical requests
+
+    :param method: http method of the request
+    :param url: url for requests
+    :param kwargs: named arguments for requests
+
+    :return: key of the request
+    """
+    if isinstance(url, bytes):
+        url = url.decode('utf-8')
+    return f'{method.upper()} {url} {dumps(kwargs, sort_keys=True, default=repr)}'
+
+
+class SingleFlight(object):
+
+    def __init__(self):
+        """initialize SingleFlight
+        identical calls in flight at the same time share the result of the first one
+
+        coalesced counts the calls that were answered without running
+        """
+        self.coalesced = 0
+        self._calls = {}
+        self._async_calls = {}
+        self._lock = Lock()
+
+    def count(self, coalesced: int) -> None:
+        """add to the number of calls avoided
+
+        :param coalesced: number of calls avoided
+        """
+        with self._lock:
+            self.coalesced += coalesced
+
+    def do(self, key: str, function: Callable) -> Any:
+        """call function, or wait for the result of the identical call already in flight
+
+        :param key: key identifying identical calls
+        :param function: function to call
+
+        :return: result of the call
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+        try:
+            result = function()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    async def ado(self, key: str, function: Callable) -> Any:
+        """await a coroutine function, or the result of the identical call already in flight on this loop
+
+        :param key: key identifying identical calls
+        :param function: coroutine function to call
+
+        :return: result of the call
+        """
+        future = self._async_calls.get(key)
+        if future is not None and future.get_loop() is asyncio.get_running_loop():
+            self.count(1)
+            return await asyncio.shield(future)
+        future = self._async_calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await function()
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._async_calls.get(key) is future:
+                del self._async_calls[key]
+
+
+class sessionbulk(aiobulk):
+
+    def bulk(self, args_list: List[list], **kwargs) -> list:
+        """aiobulk.bulk that runs on the asyncio engine of the session if it has one
+
+        when the session coalesces requests, identical get and head requests in args_list are sent once and the
+        response is returned at every position of the request, results are then in the order of args_list.
+        Streamed requests are always sent
+
+        :param args_list {List[list]}: list of arguments to send to the request
+        :param kwargs: named arguments of aiobulk.bulk
+
+        :return list of responses
+        """
+        singleflight = getattr(self.__self__, 'singleflight', None)
+        if singleflight is None or self.__name__.upper() not in SAFE_METHODS:
+            return self._bulk(args_list, **kwargs)
+        keys = []
+        for position, args in enumerate(args_list):
+            fnargs, fnkwargs = _split_args(args)
+            # the body of a streamed response can only be read once, so streamed requests are never shared
+            keys.append((position,) if fnkwargs.get('stream') else request_key(self.__name__, fnargs, fnkwargs))
+        unique = {}
+        for key, args in zip(keys, args_list):
+            unique.setdefault(key, args)
+        singleflight.count(len(keys) - len(unique))
+        kwargs['ordered'] = True
+        results = dict(zip(unique, self._bulk(list(unique.values()), **kwargs)))
+        return [results[key] for key in keys]
+
+    def _bulk(self, args_list: List[list], **kwargs) -> list:
+        """run bulk on the asyncio engine of the session if it has one, otherwise aiobulk.bulk
+
+        :param args_list {List[list]}: list of arguments to send to the request
+        :param kwargs: named arguments of aiobulk.bulk
+
+        :return list of responses
+        """
+        engine = getattr(self.__self__, 'engine', None)
+        if engine is None:
+            return super().bulk(args_list, **kwargs)
+        if kwargs.get('runner') is not None or kwargs.get('loop') is not None:
+            return aioloop(partial(self.__self__.engine_request, self.__name__), args_list, **kwargs)
+        # the connections opened on a loop owned by this call are closed before the loop is
+        kwargs.pop('runner', None)
+        kwargs.pop('loop', None)
+        with AioRunner(max_workers=kwargs.get('max_async_pool', 16)) as runner:
+            try:
+                return aioloop(partial(self.__self__.engine_request, self.__name__), args_list, runner=runner,
+                               **kwargs)
+            finally:
+                runner.run(engine.aclose())
+
+    def bulk_iter(self, args_iter: Iterable, **kwargs) -> Iterator:
+        """aiobulk.bulk_iter that runs on the asyncio engine of the session if it has one
+
+        :param args_iter {Iterable}: iterable or generator of arguments to send to the request
+        :param kwargs: named arguments of aiobulk.bulk_iter
+
+        :return iterator of responses
+        """
+        engine = getattr(self.__self__, 'engine', None)
+        if engine is None:
+            return super().bulk_iter(args_iter, **kwargs)
+        if kwargs.get('runner') is not None or kwargs.get('loop') is not None:
+            return aioloop_iter(partial(self.__self__.engine_request, self.__name__), args_iter, **kwargs)
+        kwargs.pop('runner', None)
+        kwargs.pop('loop', None)
+        return self._bulk_iter_owned(engine, args_iter, **kwargs)
+
+    def _bulk_iter_owned(self, engine: AsyncHTTPEngine, args_iter: Iterable, **kwargs) -> Iterator:
+        """bulk_iter on a runner owned by the call, the connections of the engine are closed before its loop
+
+        :param engine {AsyncHTTPEngine}: engine of the session
+        :param args_iter {Iterable}: iterable or generator of arguments to send to the request
+        :param kwargs: named arguments of aiobulk.bulk_iter
+
+        :return iterator of responses
+        """
+        with AioRunner(max_workers=kwargs.get('max_async_pool', 16)) as runner:
+            try:
+                yield from aioloop_iter(partial(self.__self__.engine_request, self.__name__), args_iter,
+                                        runner=runner, **kwargs)
+            finally:
+                runner.run(engine.aclose())
 
 
 class BaseAsyncSession(BaseSession):
+    engine: Union[AsyncHTTPEngine, None]
+    singleflight: Union[SingleFlight, None]
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, engine: str = 'requests', coalesce: bool = False, **kwargs):
         """initialize BaseAsyncSession
 
         :param args: list of args
+        :param engine: 'requests' to send bulk calls with a thread per request, or 'asyncio' to send them on
+            non blocking sockets with a keep-alive pool of pool_maxsize idle connections per host; default requests
+        :param coalesce: identical get and head requests in flight at the same time, or repeated in one bulk call,
+            share a single request and response, see coalesced for the number of requests avoided; default False
         :param kwargs: dict of named args
         """
+        if engine not in ENGINES:
+            raise ValueError(f'{"engine"!r} must be one of {ENGINES}, not {engine!r}')
         if 'pool_maxsize' not in kwargs:
             kwargs.update({'pool_maxsize': 32})
         if 'pool_connections' not in kwargs:
             kwargs.update({'pool_connections': 32})
         super().__init__(*args, **kwargs)
+        self.engine = AsyncHTTPEngine(self, max_idle_per_host=kwargs['pool_maxsize']) \
+            if engine == 'asyncio' else None
+        self.singleflight = SingleFlight() if coalesce else None
+        if self.metrics is not None and self.engine is not None:
+            self.metrics.register('http_engine_idle_connections', self.engine.idle_connections)
 
+    @property
+    def coalesced(self) -> int:
+        """number of requests avoided by coalescing"""
+        return self.singleflight.coalesced if self.singleflight is not None else 0
 
-    @aiobulk
+    def _coalesce(self, method: str, url: Union[Text, bytes], kwargs: dict) -> bool:
+        """check if a request can share the response of an identical one"""
+        return self.singleflight is not None and method.upper() in SAFE_METHODS and not kwargs.get('stream')
+
+    async def engine_request(self, method: str, url: Union[Text, bytes], **kwargs) -> Response:
+        """send a request on the asyncio engine, coalesced with identical requests in flight if enabled
+
+        :param method: http method of the request
+        :param url: url for requests
+        :param kwargs: named arguments for requests
+
+        :return: response from the engine
+        """
+        if not self._coalesce(method, url, kwargs):
+            return await self.engine.request(method, url, **kwargs)
+        return await self.singleflight.ado(request_key(method, url, kwargs),
+                                           partial(self.engine.request, method, url, **kwargs))
+
+    def close(self) -> None:
+        """close the asyncio engine connections and the requests adapters"""
+        if self.engine is not None:
+            self.engine.close()
+        super().close()
+
+    @sessionbulk
     def get(self, url: Union[Text, bytes], **kwargs) -> Response:
         """ override of BaseSession get
             aiobulk added self.get.bulk
@@ -180,9 +875,11 @@ class BaseAsyncSession(BaseSession):
 
         :return: response from requests
         """
-        return super(BaseSession, self).get(url, ** kwargs)
+        if self._coalesce('GET', url, kwargs):
+            return self.singleflight.do(request_key('GET', url, kwargs), partial(super().get, url, **kwargs))
+        return super().get(url, **kwargs)
 
-    @aiobulk
+    @sessionbulk
     def head(self, url: Union[Text, bytes], **kwargs) -> Response:
         """ override of BaseSession head
             aiobulk added self.head.bulk
@@ -192,9 +889,11 @@ class BaseAsyncSession(BaseSession):
 
         :return: response from requests
         """
-        return super(BaseSession, self).head(url, ** kwargs)
+        if self._coalesce('HEAD', url, kwargs):
+            return self.singleflight.do(request_key('HEAD', url, kwargs), partial(super().head, url, **kwargs))
+        return super().head(url, **kwargs)
 
-    @aiobulk
+    @sessionbulk
     def delete(self, url: Union[Text, bytes], **kwargs) -> Response:
         """ override of BaseSession delete
             aiobulk added self.delete.bulk
@@ -204,9 +903,9 @@ class BaseAsyncSession(BaseSession):
 
         :return: response from requests
         """
-        return super(BaseSession, self).delete(url, ** kwargs)
+        return super().delete(url, **kwargs)
 
-    @aiobulk
+    @sessionbulk
     def patch(self, url: Union[Text, bytes], **kwargs) -> Response:
         """ override of BaseSession patch
             aiobulk added self.patch.bulk
@@ -216,9 +915,9 @@ class BaseAsyncSession(BaseSession):
 
         :return: response from requests
         """
-        return super(BaseSession, self).patch(url, ** kwargs)
+        return super().patch(url, **kwargs)
 
-    @aiobulk
+    @sessionbulk
     def post(self, url: Union[Text, bytes], **kwargs) -> Response:
         """ override of BaseSession post
             aiobulk added self.post.bulk
@@ -228,9 +927,9 @@ class BaseAsyncSession(BaseSession):
 
         :return: response from requests
         """
-        return super(BaseSession, self).post(url, ** kwargs)
+        return super().post(url, **kwargs)
 
-    @aiobulk
+    @sessionbulk
     def put(self, url: Union[Text, bytes], **kwargs) -> Response:
         """ override of BaseSession put
             aiobulk added self.put.bulk
@@ -240,31 +939,141 @@ class BaseAsyncSession(BaseSession):
 
         :return: response from requests
         """
-        return super(BaseSession, self).put(url, ** kwargs)
+        return super().put(url, **kwargs)
+
+    @aiobulk
+    def download(self, url: Union[Text, bytes], path: str, **kwargs) -> Response:
+        """ override of BaseSession download
+            aiobulk added self.download.bulk, downloads always run on threads
+
+        :param url: url for requests
+        :param path: file to write the body to
+        :param kwargs: named arguments of BaseSession.download and requests
+
+        :return: response from requests
+        """
+        return super().download(url, path, **kwargs)
+
+
+class SMTPPool(object):
+
+    def __init__(self, connect: Callable[[], SMTP], max_connections: int = 4, max_messages: int = 100):
+        """initialize SMTPPool
+        a thread safe pool of at most max_connections SMTP connections, opened when they are first needed
+
+        a connection is recycled, closed and reopened on its next use, after it sent max_messages messages or
+        when sending on it failed
+
+        :param connect: callable opening a connected and authenticated SMTP connection
+        :param max_connections: max number of connections open at once; default 4
+        :param max_messages: messages sent on a connection before it is recycled, None to never recycle;
+            default 100
+        """
+        if max_connections < 1:
+            raise ValueError(f'{"max_connections"!r} must be at least 1, got {max_connections!r}')
+        self.connect = connect
+        self.max_connections = max_connections
+        self.max_messages = max_messages
+        self.opened = 0
+        self.recycled = 0
+        self._idle = LifoQueue()
+        for _ in range(max_connections):
+            self._idle.put(None)
+        self._lock = Lock()
+
+    def acquire(self) -> Tuple[SMTP, int, bool]:
+        """wait for a connection of the pool, it is opened if it was not yet
+
+        :return: connection, messages sent on it and True if it was reused
+        """
+        slot = self._idle.get()
+        if slot is not None:
+            return slot[0], slot[1], True
+        try:
+            connection = self.connect()
+        except BaseException:
+            self._idle.put(None)
+            raise
+        with self._lock:
+            self.opened += 1
+        return connection, 0, False
+
+    def release(self, connection: SMTP, sent: int, failed: bool = False) -> None:
+        """return a connection to the pool, or close it if it failed or sent max_messages messages
+
+        :param connection: connection to release
+        :param sent: messages sent on the connection
+        :param failed: True if sending on the connection failed; default False
+        """
+        if failed or (self.max_messages is not None and sent >= self.max_messages):
+            self._close(connection)
+            with self._lock:
+                self.recycled += 1
+            self._idle.put(None)
+        else:
+            self._idle.put((connection, sent))
+
+    @staticmethod
+    def _close(connection: SMTP) -> None:
+        """quit a connection, closing it if the server is already gone"""
+        try:
+            connection.quit()
+        except (SMTPException, OSError):
+            connection.close()
+
+    def close(self) -> None:
+        """close every idle connection"""
+        slots = []
+        while not self._idle.empty():
+            slot = self._idle.get()
+            if slot is not None:
+                self._close(slot[0])
+            slots.append(None)
+        for slot in slots:
+            self._idle.put(slot)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
 
 class Email(object):
 
     def __init__(self, smtp_server, smtp_port, from_address: str = None,
-                 authentication_required: bool = False, auth_username: str = None, auth_password: str = None):
-        self.host = smtp_server
-        self.port = smtp_port
-        self.from_address = from_address
-        self.smtp_session = SMTP(host=self.host, port=self.port)
-        self.smtp_session.starttls()
+                 authentication_required: bool = False, auth_username: str = None, auth_password: str = None,
+                 starttls: bool = True, timeout: float = 60.0,
+                 attachment_cache: Union[bool, AttachmentCache] = None):
+        """initialize Email
+        connects to the smtp server, send uses this connection and reconnects if the server dropped it
+
+        :param smtp_server: host of the smtp server
+        :param smtp_port: port of the smtp server
+        :param from_address: default address to send email from; default None
+        :param authentication_required: login with auth_username and auth_password; default False
+        :param auth_username: username to login with; default None
+        :param auth_password: password to login with; default None
+        :param starttls: upgrade connections with STARTTLS; default True
+        :param timeout: seconds to wait on the smtp server; default 60.0
+        :param attachment_cache: AttachmentCache, or True for a new one, to read and encode each logo and
+            attachment once across emails; default None
+        """
         if authentication_required:
             if not auth_username:
                 raise ValueError(f'{"auth_username"!r} cannot be NoneType if {"authentication_required"!r} is True')
             if not auth_password:
                 raise ValueError(f'{"auth_password"!r} cannot be NoneType if {"authentication_required"!r} is True')
-            self.smtp_session.login(auth_username, auth_password)
+        self.host = smtp_server
+        self.port = smtp_port
+        self.from_address = from_address
+        self.starttls = starttls
+        self.timeout = timeout
+        self._auth = (auth_username, auth_password) if authentication_required else None
+        self.attachment_cache = AttachmentCache() if attachment_cache is True else attachment_cache or None
+        self.smtp_session = self.connect()
 
-        logging.basicConfig(
-            level=logging.INFO,
-            format='[%(asctime)s] %(levelname)s - %(message)s',
-            datefmt='%H:%M:%S'
-        )
-        self.email_logger = logging.getLogger(name='Mailer')
+        self.email_logger = queue_logger('Mailer')
         self.log_msg_fmt = 'From: {from_address}, To: {to_addresses}, CC: {cc_addresses}, {subject}, ' \
                            'attachments: {attach_len}'
 
@@ -272,30 +1081,44 @@ class Email(object):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.smtp_session.quit()
+        SMTPPool._close(self.smtp_session)
 
-    def send(self, subject: str, body: str, to_address_list: list, cc_address_list: list = None,
-             from_address: str = None, encoding: str = 'html', logo_images: list = None,
-             file_attachments: list = None) -> dict:
-        """
+    def connect(self) -> SMTP:
+        """open a new connection to the smtp server, upgraded with STARTTLS and logged in if configured
 
-        :param subject: Subject string for email, required
-        :param body: Message content for email, required
-        :param to_address_list: addresses to send email to, required
-        :param cc_address_list: addresses to cc on email, default: None
-        :param from_address: address to send email from, default: None, will use self.from_address if one was given
-        :param encoding: encoding for body, default: html
-        :param logo_images: list of paths to images to use for logos, default: None
-        :param file_attachments: list of paths to attachments for email, default: None
-
-        :return: dict
+        :return: smtp connection
+        """
+        connection = SMTP(host=self.host, port=self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                connection.starttls()
+            if self._auth:
+                connection.login(*self._auth)
+        except BaseException:
+            connection.close()
+            raise
+        return connection
+
+    def message(self, subject: str, body: str, to_address_list: list, cc_address_list: list = None,
+                from_address: str = None, encoding: str = 'html', logo_images: list = None,
+                file_attachments: list = None, attachment_cache: AttachmentCache = None) -> Tuple[str, list, str]:
+        """build and serialize an email, see send for the other arguments
+
+        with an attachment cache, logos and attachments are the cached encoded parts, spliced into the
+        serialized email so only the body and headers are built for every email
+
+        :param attachment_cache: cache of encoded logos and attachments; default self.attachment_cache
+
+        :return: from address, every recipient, and the serialized email
         """
         assert isinstance(to_address_list, list)
+        attachment_cache = attachment_cache or self.attachment_cache
         email_from = from_address or self.from_address
         if not email_from:
             raise ValueError(f'{"email_from"!r} cannot be NoneType if {"from_address"!r} is not set.')
 
-        email = MIMEMultipart()
+        boundary = f'{"=" * 15}{uuid4().hex}==' if attachment_cache is not None else None
+        email = MIMEMultipart(boundary=boundary)
         email['From'] = email_from
         email['To'] = ', '.join(to_address_list)
         email['Date'] = formatdate(localtime=True)
@@ -306,19 +1129,20 @@ class Email(object):
         email['Subject'] = subject
         email.attach(MIMEText(body, encoding, 'utf-8'))
 
-        if logo_images:
-            for lpath in logo_images:
-                with open(lpath, 'rb') as fin:
-                    email.attach(MIMEImage(fin.read()))
-        if file_attachments:
-            for fpath in file_attachments:
-                filename = basename(fpath)
-                with open(fpath, 'rb') as fin:
-                    attachment = MIMEApplication(fin.read(), Name=filename)
-                    attachment['Content-Disposition'] = f'attachment; filename={filename}'
-                    email.attach(attachment)
-
-        full_address_list = to_address_list
+        paths = [(lpath, 'logo') for lpath in logo_images or []] + \
+                [(fpath, 'attachment') for fpath in file_attachments or []]
+        if attachment_cache is None:
+            for path, kind in paths:
+                email.attach(AttachmentCache.part(path, kind))
+            message = email.as_string()
+        else:
+            parts = [attachment_cache.get(path, kind) for path, kind in paths]
+            message = email.as_string()
+            if parts:
+                end = message.rindex(f'\n--{boundary}--')
+                message = message[:end] + ''.join(f'\n--{boundary}\n{part}' for part in parts) + message[end:]
+
+        full_address_list = list(to_address_list)
         if cc_address_list:
             full_address_list.extend(cc_address_list)
         self.email_logger.info(self.log_msg_fmt.format(from_address=email_from,
@@ -329,25 +1153,367 @@ class Email(object):
                                                        if file_attachments else 0
             )
         )
-        return self.smtp_session.sendmail(email_from, full_address_list, email.as_string())
+        return email_from, full_address_list, message
 
+    def send(self, subject: str, body: str, to_address_list: list, cc_address_list: list = None,
+             from_address: str = None, encoding: str = 'html', logo_images: list = None,
+             file_attachments: list = None) -> dict:
+        """
+
+        :param subject: Subject string for email, required
+        :param body: Message content for email, required
+        :param to_address_list: addresses to send email to, required
+        :param cc_address_list: addresses to cc on email, default: None
+        :param from_address: address to send email from, default: None, will use self.from_address if one was given
+        :param encoding: encoding for body, default: html
+        :param logo_images: list of paths to images to use for logos, default: None
+        :param file_attachments: list of paths to attachments for email, default: None
+
+        :return: dict
+        """
+        email_from, full_address_list, message = self.message(subject, body, to_address_list, cc_address_list,
+                                                              from_address, encoding, logo_images, file_attachments)
+        try:
+            return self.smtp_session.sendmail(email_from, full_address_list, message)
+        except SMTPServerDisconnected:
+            self.smtp_session = self.connect()
+            return self.smtp_session.sendmail(email_from, full_address_list, message)
+
+    def _send_pooled(self, pool: SMTPPool, **kwargs) -> dict:
+        """build an email and send it on a connection of the pool, a stale reused connection is retried once
+
+        :param pool: pool of connections to send with
+        :param kwargs: named arguments of send
+
+        :return: result of the message, see send_bulk
+        """
+        result = {'to_address_list': kwargs.get('to_address_list'), 'refused': {}, 'error': None}
+        try:
+            email_from, full_address_list, message = self.message(**kwargs)
+            while True:
+                connection, sent, reused = pool.acquire()
+                try:
+                    result['refused'] = connection.sendmail(email_from, full_address_list, message)
+                except SMTPRecipientsRefused as exc:
+                    pool.release(connection, sent + 1)
+                    result.update(refused=exc.recipients, error=repr(exc))
+                except SMTPServerDisconnected:
+                    pool.release(connection, sent, failed=True)
+                    if reused:
+                        continue
+                    raise
+                except BaseException:
+                    pool.release(connection, sent, failed=True)
+                    raise
+                else:
+                    pool.release(connection, sent + 1)
+                return result
+        except (SMTPException, OSError, TypeError, ValueError, AssertionError) as exc:
+            result['error'] = repr(exc)
+            return result
+
+    def send_bulk(self, messages: Iterable[dict], max_connections: int = 4, max_messages_per_connection: int = 100,
+                  disable_progress_bar: bool = False, **kwargs) -> List[dict]:
+        """send many emails in parallel on a pool of smtp connections
+
+        Ex.
+            email.send_bulk([{'subject': 'hi', 'body': 'hello', 'to_address_list': ['a@b.com']}, ...])
+
+        :param messages: iterable of dicts of the named arguments of send, one per email
+        :param max_connections: number of connections, and emails sent at once; default 4
+        :param max_messages_per_connection: emails sent on a connection before it is reopened, None to never
+            reopen; default 100
+        :param disable_progress_bar: disable the progress bar of aioloop; default False
+        :param kwargs: named arguments of aioloop, like runner
+
+        :return: list of results in the order of messages, dicts of to_address_list, refused recipients and error,
+            error is None if the email was sent
+        """
+        with SMTPPool(self.connect, max_connections, max_messages_per_connection) as pool:
+            return aioloop(partial(self._send_pooled, pool), ([message] for message in messages),
+                           max_async_pool=max_connections, ordered=True, disable_progress_bar=disable_progress_bar,
+                           **kwargs)
+
+    def mail_merge(self, subject: str, body: str, recipients: Iterable[dict], from_address: str = None,
+                   encoding: str = 'html', logo_images: list = None, file_attachments: list = None,
+                   disable_progress_bar: bool = False, **kwargs) -> List[dict]:
+        """send a personalised email to every recipient with send_bulk, logos and attachments are read and encoded
+        once with the attachment_cache, or a new one for this call if the Email has none
+
+        Ex.
+            email.mail_merge('Report for {name}', 'Hello {name}', [{'to_address_list': ['a@b.com'], 'name': 'A'}],
+                             file_attachments=['report.pdf'])
+
+        :param subject: subject template, formatted with the fields of each recipient
+        :param body: body template, formatted with the fields of each recipient
+        :param recipients: iterable of dicts with to_address_list, an optional cc_address_list and the fields of
+            the templates
+        :param from_address: address to send email from; default self.from_address
+        :param encoding: encoding for body; default html
+        :param logo_images: list of paths to images to use for logos; default None
+        :param file_attachments: list of paths to attachments for email; default None
+        :param disable_progress_bar: disable the progress bar of send_bulk; default False
+        :param kwargs: named arguments of send_bulk
+
+        :return: list of results in the order of recipients, see send_bulk
+        """
+        attachment_cache = self.attachment_cache or AttachmentCache()
+        messages = ({'subject': subject.format(**recipient), 'body': body.format(**recipient),
+                     'to_address_list': recipient.get('to_address_list'),
+                     'cc_address_list': recipient.get('cc_address_list'), 'from_address': from_address,
+                     'encoding': encoding, 'logo_images': logo_images, 'file_attachments': file_attachments,
+                     'attachment_cache': attachment_cache}
+                    for recipient in recipients)
+        return self.send_bulk(messages, disable_progress_bar=disable_progress_bar, **kwargs)
+
+
+def _matcher(pattern: Union[str, Iterable[str]], regex: bool = False) -> Callable[[str], list]:
+    """compile a pattern, or a collection of patterns, once into a function finding their matches in a string
+
+    :param pattern: the string representation of the pattern, or a collection of them matched with a PatternSet
+    :param regex: flag for using a pattern as regex or string compare
 
-def urlscraper(url: str, pattern: str, regex:bool=False) -> list:
+    :return: function returning (index of the pattern, match) pairs of a string, a match is the regex match or the
+        string if it contains the pattern
+    """
+    if not isinstance(pattern, str):
+        return PatternSet(pattern, regex).findall
+    if regex:
+        findall = compile(pattern).findall
+        return lambda text: [(0, match) for match in findall(text)]
+    return lambda text: [(0, text)] if pattern in text else []
+
+
+def _page_matches(strings: Iterable[str], matcher: Callable[[str], list], patterns: int = 1,
+                  max_matches: int = None) -> List[list]:
+    """find the unique matches of the strings of a page for every pattern, see urlscraper
+
+    :param strings: strings of the page
+    :param matcher: function returning the (index of the pattern, match) pairs of a string, see _matcher
+    :param patterns: number of patterns; default 1
+    :param max_matches: stop once every pattern has this many unique matches; default None
+
+    :return: list of the unique matches of every pattern in the order they were found
+    """
+    matches = [{} for _ in range(patterns)]
+    complete = 0
+    for text in strings:
+        for index, match in matcher(text):
+            found = matches[index]
+            if match not in found and (max_matches is None or len(found) < max_matches):
+                found[match] = None
+                complete += max_matches is not None and len(found) == max_matches
+        if max_matches is not None and complete == patterns:
+            break
+    return [list(found) for found in matches]
+
+
+def _grouped(pattern: Union[str, Iterable[str]], matches: List[list]) -> Union[list, dict]:
+    """matches of a single pattern, or a dict of every pattern of a collection to its matches"""
+    if isinstance(pattern, str):
+        return matches[0]
+    return dict(zip(pattern, matches))
+
+
+def _stream_strings(resp: Response, parser: HTMLTextParser, chunk_size: int = 64 * 1024) -> Iterator[str]:
+    """parse a streamed response as its chunks arrive, the response is closed when the iterator is
+
+    :param resp: response requested with stream=True
+    :param parser: parser of the page
+    :param chunk_size: bytes read at a time; default 64KB
+
+    :return: iterator of the strings of the page, see HTMLTextParser
+    """
+    decoder = None
+    try:
+        for chunk in resp.iter_content(chunk_size):
+            if decoder is None:
+                decoder = incremental_decoder(resp.headers.get('Content-Type'), chunk)
+            yield from parser.feed_strings(decoder.decode(chunk))
+        if decoder is not None:
+            yield from parser.feed_strings(decoder.decode(b'', final=True))
+        yield from parser.close_strings()
+    finally:
+        resp.close()
+
+
+def _page_links(links: Iterable[str], base_url: str) -> Iterator[str]:
+    """absolute http and https links of a page, without fragments
+
+    :param links: href of the anchors of the page
+    :param base_url: url of the page, relative links are resolved against it
+
+    :return: iterator of links
+    """
+    for href in links:
+        link = urldefrag(urljoin(base_url, href)).url
+        if urlsplit(link).scheme in ('http', 'https'):
+            yield link
+
+
+def urlscraper(url: str, pattern: Union[str, Iterable[str]], regex:bool=False, session: BaseSession = None,
+               stream: bool = False, max_matches: int = None) -> Union[list, dict]:
     """urlscraper is a simple method to scrape information from a url based on a given string pattern
 
     :param url: the url to run pattern against
-    :param pattern: the string representation of the pattern
+    :param pattern: the string representation of the pattern, or a collection of them matched against the page
+        fetched once, see PatternSet
     :param regex: flag for using a pattern as regex or string compare
-
-    :return: list of strings that matched or contained pattern
+    :param session: session to reuse, for example one with a response cache; default None, a new BaseSession
+    :param stream: parse the text of the page as it is downloaded without building a tree, the strings searched
+        are the same; default False
+    :param max_matches: stop once this many unique matches are found for every pattern, with stream the rest of
+        the page is not downloaded; default None
+
+    :return: list of strings that matched or contained pattern, or a dict of every pattern of a collection to its
+        list
     """
-    matches: list = []
-    resp = BaseSession().get(url, headers={'User-Agent': 'Chrome Python3'})
+    if not isinstance(pattern, str):
+        pattern = list(pattern)
+    session = session or BaseSession()
+    matcher = _matcher(pattern, regex)
+    patterns = 1 if isinstance(pattern, str) else len(pattern)
+    if stream:
+        resp = session.get(url, headers={'User-Agent': 'Chrome Python3'}, stream=True)
+        if resp.status_code != 200:
+            resp.close()
+            return _grouped(pattern, [[] for _ in range(patterns)])
+        strings = _stream_strings(resp, HTMLTextParser())
+        try:
+            return _grouped(pattern, _page_matches(strings, matcher, patterns, max_matches))
+        finally:
+            strings.close()
+    resp = session.get(url, headers={'User-Agent': 'Chrome Python3'})
     if resp.status_code == 200:
-        soup = BeautifulSoup(resp.content, 'html.parser')
-        if regex:
-            matches.extend([match for text in soup.stripped_strings for match in findall(pattern, text)])
+        strings = BeautifulSoup(resp.content, 'html.parser').stripped_strings
+        return _grouped(pattern, _page_matches(strings, matcher, patterns, max_matches))
+    return _grouped(pattern, [[] for _ in range(patterns)])
+
+
+class _Frontier(object):
+
+    def __init__(self):
+        """initialize _Frontier
+        urls of a crawl waiting to be fetched with their depth, handed out a host at a time so the pages of one host
+        do not hold every worker on its limit
+
+        an iterator that can be refilled, it raises StopIteration while empty and aioloop_iter reads it again as
+        pages finish
+        """
+        self._hosts = OrderedDict()
+
+    def add(self, url: str, depth: int) -> None:
+        """add a url found at a depth"""
+        self._hosts.setdefault(urlsplit(url).netloc.lower(), deque()).append((url, depth))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> list:
+        if not self._hosts:
+            raise StopIteration
+        host, urls = next(iter(self._hosts.items()))
+        url, depth = urls.popleft()
+        if urls:
+            self._hosts.move_to_end(host)
         else:
-            matches.extend([text for text in soup.stripped_strings if pattern in text])
-    return list(set(matches))
+            del self._hosts[host]
+        return [url, depth]
 
+
+def urlcrawler(seeds: Union[str, Iterable[str]], pattern: Union[str, Iterable[str]], regex: bool = False,
+               max_depth: int = 1, max_pages: int = 100, same_domain: bool = True, session: BaseAsyncSession = None,
+               max_async_pool: int = 16, max_per_host: int = 4, runner: AioRunner = None,
+               stream: bool = False) -> Iterator[tuple]:
+    """crawl pages from seed urls and scrape each of them like urlscraper
+
+    pages are fetched concurrently through one shared session from a single frontier, the links of a page are
+    fetched while the rest of the pages are still in flight. Links are deduplicated without their fragment and each
+    url is fetched once, a page redirected to a page already seen is not yielded again
+
+    Ex.
+        for url, matches in urlcrawler('https://example.com', '[A-Fa-f0-9]{64}', regex=True, max_depth=2):
+            print(url, matches)
+
+    :param seeds: url or urls to start from, at depth 0
+    :param pattern: the string representation of the pattern, or a collection of them, see urlscraper
+    :param regex: flag for using a pattern as regex or string compare
+    :param max_depth: links followed from a seed before stopping; default 1
+    :param max_pages: max number of pages fetched; default 100
+    :param same_domain: only follow links to the hosts of the seeds; default True
+    :param session: session to fetch with; default None, a new BaseAsyncSession closed after the crawl
+    :param max_async_pool: max number of pages fetched at once; default 16
+    :param max_per_host: max number of pages fetched at once from a single host; default 4
+    :param runner: AioRunner to fetch with; default None
+    :param stream: parse pages as they are downloaded without building a tree, see urlscraper; default False
+
+    :return: iterator of (url, matches of the page as returned by urlscraper), as each page is processed
+    """
+    if not isinstance(pattern, str):
+        pattern = list(pattern)
+    patterns = 1 if isinstance(pattern, str) else len(pattern)
+    no_matches = _grouped(pattern, [[] for _ in range(patterns)])
+    own_session = session is None
+    session = session or BaseAsyncSession()
+    seeds = [seeds] if isinstance(seeds, str) else list(seeds)
+    hosts = {urlsplit(seed).netloc.lower() for seed in seeds}
+    host_limits = {}
+    host_limits_lock = Lock()
+    matcher = _matcher(pattern, regex)
+
+    def fetch(url: str, depth: int) -> tuple:
+        """matches and links of a page, the url it was redirected to and its depth, a page that fails has neither"""
+        host = urlsplit(url).netloc.lower()
+        with host_limits_lock:
+            host_limit = host_limits.setdefault(host, BoundedSemaphore(max_per_host))
+        final_url = url
+        try:
+            with host_limit:
+                resp = session.get(url, headers={'User-Agent': 'Chrome Python3'}, stream=stream)
+                final_url = urldefrag(resp.url).url
+                if resp.status_code != 200:
+                    resp.close()
+                    return url, no_matches, [], final_url, depth
+                if stream:
+                    parser = HTMLTextParser(collect_links=True)
+                    matches = _page_matches(_stream_strings(resp, parser), matcher, patterns)
+                    links = list(_page_links(parser.links, resp.url))
+                    return url, _grouped(pattern, matches), links, final_url, depth
+                content = resp.content
+            soup = BeautifulSoup(content, 'html.parser')
+            links = (anchor['href'] for anchor in soup.find_all('a', href=True))
+            matches = _page_matches(soup.stripped_strings, matcher, patterns)
+            return url, _grouped(pattern, matches), list(_page_links(links, resp.url)), final_url, depth
+        except (RequestException, ParserRejectedMarkup, ValueError):
+            return url, no_matches, [], final_url, depth
+
+    seen = set()
+    frontier = _Frontier()
+    pages = 0
+
+    def enqueue(url: str, depth: int) -> None:
+        """add an unseen url to the frontier while max_pages allows it"""
+        nonlocal pages
+        if url not in seen and pages < max_pages:
+            seen.add(url)
+            frontier.add(url, depth)
+            pages += 1
+
+    for seed in seeds:
+        enqueue(urldefrag(seed).url, 0)
+    try:
+        # links are added to the frontier while the rest of the pages are in flight, aioloop_iter reads it again
+        for url, matches, links, final_url, depth in aioloop_iter(fetch, frontier, max_async_pool=max_async_pool,
+                                                                  runner=runner, disable_progress_bar=True):
+            if final_url != url and final_url in seen:
+                # redirected to a page that was already fetched or is in the frontier
+                continue
+            seen.add(final_url)
+            if depth < max_depth:
+                for link in links:
+                    if not same_domain or urlsplit(link).netloc.lower() in hosts:
+                        enqueue(link, depth + 1)
+            yield url, matches
+    finally:
+        if own_session:
+            session.close()
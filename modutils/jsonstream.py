@@ -0,0 +1,257 @@
+import codecs
+import json
+import re
+
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Union
+from requests import Response
+
+WILDCARD = '*'
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+STRING_BODY = re.compile(r'(?:[^"\\]|\\.)*', re.S)
+STRUCTURAL = re.compile(r'[\[\]{}"]')
+SCALAR = re.compile(r'[^\s,\]}:]*')
+
+
+class _Reader(object):
+
+    def __init__(self, chunks: Iterable[Union[bytes, str]]):
+        """initialize _Reader
+        a text buffer over an iterable of chunks, consumed text is dropped when more is read
+
+        text from mark is kept in captured while a value is captured, so a selected value is the only thing held
+        in memory besides the current chunk
+        """
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.mark = None
+        self.captured: List[str] = []
+
+    def fill(self) -> bool:
+        """read the next chunk into the buffer
+
+        :return: False if there is nothing left to read
+        """
+        if self.mark is not None:
+            self.captured.append(self.buf[self.mark:self.pos])
+            self.mark = 0
+        self.buf = self.buf[self.pos:]
+        self.pos = 0
+        while not self.eof:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self.eof = True
+                text = self._decoder.decode(b'', final=True)
+            else:
+                text = self._decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+            if text:
+                self.buf += text
+                return True
+        return False
+
+    def need(self) -> None:
+        """read more text or raise if the document ended"""
+        if not self.fill():
+            raise ValueError('unexpected end of json document')
+
+    def peek(self) -> str:
+        """skip whitespace and return the next character without consuming it, empty at the end"""
+        if self.pos < len(self.buf) and self.buf[self.pos] not in ' \t\n\r':
+            return self.buf[self.pos]
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, characters: str) -> str:
+        """consume the next character, it must be one of characters"""
+        char = self.peek()
+        if not char or char not in characters:
+            raise ValueError(f'expected one of {characters!r} at {char!r} in json document')
+        self.pos += 1
+        return char
+
+    def string(self) -> str:
+        """consume a string, the opening quote is next"""
+        self.expect('"')
+        start = self.pos
+        while True:
+            end = STRING_BODY.match(self.buf, start).end()
+            if end < len(self.buf) and self.buf[end] == '"':
+                raw = self.buf[start:end]
+                self.pos = end + 1
+                return json.loads(f'"{raw}"') if '\\' in raw else raw
+            offset = start - self.pos
+            self.need()
+            start = self.pos + offset
+
+    def skip(self) -> None:
+        """consume a value without decoding it, only brackets and strings are looked at"""
+        char = self.peek()
+        if not char:
+            raise ValueError('unexpected end of json document')
+        if char not in '"[{':
+            while True:
+                end = SCALAR.match(self.buf, self.pos).end()
+                if end < len(self.buf) or not self.fill():
+                    self.pos = end
+                    return
+        depth = 0
+        in_string = False
+        while True:
+            if in_string:
+                end = STRING_BODY.match(self.buf, self.pos).end()
+                if end < len(self.buf) and self.buf[end] == '"':
+                    self.pos = end + 1
+                    in_string = False
+                    if depth == 0:
+                        return
+                    continue
+                # stop before a trailing backslash so the escape is read whole with the next chunk
+                self.pos = end
+                self.need()
+                continue
+            match = STRUCTURAL.search(self.buf, self.pos)
+            if match is None:
+                self.pos = len(self.buf)
+                self.need()
+                continue
+            self.pos = match.end()
+            char = match.group()
+            if char == '"':
+                in_string = True
+            elif char in '[{':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def value(self) -> Any:
+        """consume and decode a value"""
+        self.peek()
+        self.mark = self.pos
+        self.captured = []
+        try:
+            self.skip()
+            text = ''.join(self.captured) + self.buf[self.mark:self.pos]
+        finally:
+            self.mark = None
+            self.captured = []
+        return json.loads(text)
+
+
+def _walk(value: Any, pattern: tuple, path: tuple) -> Iterator[Tuple[tuple, Any]]:
+    """find a path pattern in a decoded value"""
+    if not pattern:
+        yield path, value
+        return
+    key, rest = pattern[0], pattern[1:]
+    if isinstance(value, dict):
+        items = value.items() if key == WILDCARD else ((key, value[key]),) if key in value else ()
+    elif isinstance(value, list):
+        if key == WILDCARD:
+            items = enumerate(value)
+        else:
+            items = ((key, value[key]),) if isinstance(key, int) and 0 <= key < len(value) else ()
+    else:
+        items = ()
+    for child_key, child in items:
+        yield from _walk(child, rest, path + (child_key,))
+
+
+def _children(patterns: List[tuple]) -> Tuple[List[tuple], Dict[Union[str, int], List[tuple]]]:
+    """remaining patterns of the children of a container, for any key and for each key named by a pattern"""
+    wildcard = [pattern[1:] for pattern in patterns if pattern[0] == WILDCARD]
+    keys = {pattern[0] for pattern in patterns if pattern[0] != WILDCARD}
+    return wildcard, {key: [pattern[1:] for pattern in patterns if pattern[0] in (key, WILDCARD)] for key in keys}
+
+
+def _select(reader: _Reader, path: tuple, patterns: List[tuple]) -> Iterator[Tuple[tuple, Any]]:
+    """yield the values of a json value matching patterns, only containers on the way to them are parsed"""
+    if () in patterns:
+        value = reader.value()
+        yield path, value
+        # longer patterns are found in the decoded value, overlapping ones can find a path more than once
+        found = {path}
+        for pattern in dict.fromkeys(patterns):
+            for child_path, child in _walk(value, pattern, path) if pattern else ():
+                if child_path not in found:
+                    found.add(child_path)
+                    yield child_path, child
+        return
+    wildcard, named = _children(patterns)
+    char = reader.peek()
+    if char == '{':
+        reader.pos += 1
+        if reader.peek() == '}':
+            reader.pos += 1
+            return
+        while True:
+            key = reader.string()
+            reader.expect(':')
+            children = named.get(key, wildcard)
+            if children:
+                yield from _select(reader, path + (key,), children)
+            else:
+                reader.skip()
+            if reader.expect(',}') == '}':
+                return
+    elif char == '[':
+        reader.pos += 1
+        if reader.peek() == ']':
+            reader.pos += 1
+            return
+        index = 0
+        while True:
+            children = named.get(index, wildcard)
+            if children:
+                yield from _select(reader, path + (index,), children)
+            else:
+                reader.skip()
+            if reader.expect(',]') == ']':
+                return
+            index += 1
+    else:
+        reader.skip()
+
+
+def json_stream(source: Union[Response, Iterable[Union[bytes, str]]], paths: Iterable[Iterable],
+                chunk_size: int = 64 * 1024) -> Iterator[Tuple[tuple, Any]]:
+    """json_stream - parse a json document incrementally and yield only the values at nget style paths
+    Ex.
+        response = session.get(url, stream=True)
+        for path, value in json_stream(response, [['data', '*', 'id'], ['meta', 'count']]):
+            ...
+
+    keys index objects, integer keys index arrays and '*' matches every member of an object or element of an
+    array, negative indices are not supported since the length of an array is only known at its end. Values
+    outside the paths are skipped without being decoded, so memory is bounded by the largest selected value.
+    Every path is yielded once, even if more than one of the paths match it
+
+    :param source: response requested with stream=True, it is closed at the end, or an iterable of utf-8 bytes or
+        str chunks
+    :param paths: iterable of paths, each an iterable of keys
+    :param chunk_size: bytes read at a time from a response; default 64KB
+    :return: iterator of (path with the actual keys and indices, value) in document order
+    """
+    patterns = [tuple(path) for path in paths]
+    for pattern in patterns:
+        if any(isinstance(key, int) and key < 0 for key in pattern):
+            raise ValueError(f'{"paths"!r} cannot have negative indices, not {list(pattern)!r}')
+    chunks = source.iter_content(chunk_size) if isinstance(source, Response) else source
+    try:
+        reader = _Reader(chunks)
+        if not reader.peek():
+            raise ValueError('empty json document')
+        yield from _select(reader, (), patterns)
+        if reader.peek():
+            raise ValueError(f'extra data at {reader.peek()!r} after json document')
+    finally:
+        if isinstance(source, Response):
+            source.close()
@@ -0,0 +1,121 @@
+import atexit
+import logging
+
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from random import random
+from threading import Lock
+from typing import Union
+
+LOG_FORMAT = '[%(asctime)s] %(levelname)s - %(message)s'
+LOG_DATE_FORMAT = '%H:%M:%S'
+
+_listeners = {}
+_listeners_lock = Lock()
+
+
+class _RecordQueueHandler(QueueHandler):
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """enqueue the record as it is, the writer thread formats it instead of the thread that logged it"""
+        return record
+
+
+class _PropagateHandler(logging.Handler):
+
+    def __init__(self, logger: logging.Logger):
+        """initialize _PropagateHandler
+        hand records to the handlers of the ancestors of a logger, like propagation does, from the writer thread
+
+        :param logger: logger whose records are propagated
+        """
+        super().__init__()
+        self.logger = logger
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        if self.logger.parent is not None:
+            self.logger.parent.callHandlers(record)
+        return True
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.handle(record)
+
+
+def queue_logger(name: str, handler: logging.Handler = None) -> logging.Logger:
+    """get a logger whose records are put on a queue and handled by a background thread
+
+    the writer thread hands every record to the handler, if one is given, and then to the handlers of the root
+    logger and other ancestors the same way propagation does, so logging configured by the application still
+    receives and formats the records. Logging is not configured here, the level of the logger is left to the
+    application, e.g. logging.basicConfig(level=logging.INFO, format=LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+
+    the first call for a name starts the writer thread of the logger, later calls return the same logger and
+    replace its handler if one is given
+
+    :param name: name of the logger
+    :param handler: handler the writer thread writes records with before propagating them; default None
+
+    :return: logger
+    """
+    with _listeners_lock:
+        logger = logging.getLogger(name)
+        listener = _listeners.get(name)
+        if listener is None:
+            queue = SimpleQueue()
+            listener = QueueListener(queue, _PropagateHandler(logger), respect_handler_level=True)
+            listener.start()
+            atexit.register(listener.stop)
+            logger.addHandler(_RecordQueueHandler(queue))
+            # records are propagated by the writer thread instead
+            logger.propagate = False
+            _listeners[name] = listener
+        if handler is not None:
+            listener.handlers = (handler, listener.handlers[-1])
+        return logger
+
+
+class RequestLog(object):
+
+    def __init__(self, name: str = 'BaseSession', sample_rate: float = 1.0, error_sample_rate: float = 1.0,
+                 handler: logging.Handler = None):
+        """initialize RequestLog
+        sampled, structured logging of responses on a queue_logger
+
+        records are only built when the level of the logger is enabled and the response is sampled. The fields of a
+        record are also set as attributes of the LogRecord, so a handler or formatter can read them directly
+
+        :param name: name of the logger; default BaseSession
+        :param sample_rate: fraction of responses with a status code below 400 to log; default 1.0
+        :param error_sample_rate: fraction of responses with a status code of 400 or more to log; default 1.0
+        :param handler: handler of the writer thread, see queue_logger; default None
+        """
+        for option, rate in (('sample_rate', sample_rate), ('error_sample_rate', error_sample_rate)):
+            if not 0 <= rate <= 1:
+                raise ValueError(f'{option!r} must be between 0 and 1, got {rate!r}')
+        self.logger = queue_logger(name, handler)
+        self.sample_rate = sample_rate
+        self.error_sample_rate = error_sample_rate
+
+    def enabled(self, level: int = logging.INFO) -> bool:
+        """True if the logger writes records of a level"""
+        return self.logger.isEnabledFor(level)
+
+    def sampled(self, status_code: Union[int, None]) -> bool:
+        """decide if a response is logged
+
+        :param status_code: status code of the response
+
+        :return: True if the response is logged
+        """
+        rate = self.sample_rate if status_code is not None and status_code < 400 else self.error_sample_rate
+        return rate >= 1 or (rate > 0 and random() < rate)
+
+    def log(self, level: int, msg: str, fields: dict) -> None:
+        """write a record without looking up the caller, the message is formatted from fields by the writer thread
+
+        :param level: level of the record
+        :param msg: %-style message with named fields
+        :param fields: values of the message, also set as attributes of the record
+        """
+        self.logger.handle(self.logger.makeRecord(self.logger.name, level, '', 0, msg, (fields,), None,
+                                                  extra=fields))
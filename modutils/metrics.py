@@ -0,0 +1,219 @@
+from bisect import bisect_left
+from threading import Lock
+from typing import Callable, Dict, Iterable, List, Tuple, Union
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ATTEMPT_BUCKETS = (1, 2, 3, 4, 6, 10)
+
+METRIC_HELP = {
+    'http_requests_total': 'resolved requests by host, method and status class',
+    'http_request_duration_seconds': 'seconds to resolve a request, including retries and rate limit waits',
+    'http_request_attempts': 'attempts sent to resolve a request',
+    'http_retries_total': 'retries sent by the retry policy',
+    'http_request_bytes_total': 'bytes of request bodies sent',
+    'http_response_bytes_total': 'bytes of response bodies received',
+    'http_requests_in_flight': 'requests being resolved',
+    'http_pool_connections_in_use': 'connections of the requests adapter pool checked out',
+    'http_pool_maxsize': 'max connections of the requests adapter pool',
+    'http_engine_idle_connections': 'idle keep-alive connections of the asyncio engine',
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram(object):
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS):
+        """initialize Histogram
+        fixed bucket histogram, an observation is counted in the first bucket it is less than or equal to
+
+        :param buckets: sorted upper bounds of the buckets, values above the last bound are counted in +Inf;
+            default LATENCY_BUCKETS
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """count a value in its bucket"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """cumulative count of every bucket, the last bound is +Inf"""
+        total = 0
+        cumulative = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return cumulative
+
+    def quantile(self, q: float) -> Union[float, None]:
+        """estimate a quantile by linear interpolation inside the bucket it falls in
+
+        :param q: quantile between 0 and 1
+
+        :return: estimated value, the last finite bound if it falls in +Inf, or None without observations
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        lower, previous = 0.0, 0
+        for bound, total in self.cumulative():
+            if total >= rank:
+                if bound == float('inf'):
+                    return lower
+                return lower + (bound - lower) * ((rank - previous) / (total - previous) if total > previous else 0)
+            lower, previous = bound, total
+        return lower
+
+
+class MetricsRegistry(object):
+
+    def __init__(self, namespace: str = 'modutils'):
+        """initialize MetricsRegistry
+        thread safe in-process counters, gauges and fixed bucket histograms keyed by name and labels
+
+        labels are a tuple of (name, value) pairs, used as is for the key so recording a value costs a dict lookup.
+        Collectors are called on snapshot and prometheus to read values that are owned elsewhere, like the size
+        of a connection pool
+
+        :param namespace: prefix of metric names in the prometheus text format; default modutils
+        """
+        self.namespace = namespace
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._gauges: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._collectors: Dict[str, Callable[[], Iterable[Tuple[Labels, float]]]] = {}
+        self._lock = Lock()
+
+    def inc(self, name: str, labels: Labels = (), value: float = 1) -> None:
+        """add to a counter
+
+        :param name: name of the counter
+        :param labels: labels of the counter; default ()
+        :param value: amount to add; default 1
+        """
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + value
+
+    def add(self, name: str, labels: Labels = (), value: float = 1) -> None:
+        """add to a gauge, a negative value lowers it
+
+        :param name: name of the gauge
+        :param labels: labels of the gauge; default ()
+        :param value: amount to add; default 1
+        """
+        with self._lock:
+            series = self._gauges.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + value
+
+    def observe(self, name: str, value: float, labels: Labels = (), buckets: Iterable[float] = LATENCY_BUCKETS) -> None:
+        """count a value in a histogram
+
+        :param name: name of the histogram
+        :param value: value to count
+        :param labels: labels of the histogram; default ()
+        :param buckets: bucket bounds, only used when the histogram is created; default LATENCY_BUCKETS
+        """
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = Histogram(buckets)
+            histogram.observe(value)
+
+    def register(self, name: str, collector: Callable[[], Iterable[Tuple[Labels, float]]]) -> None:
+        """register a gauge whose values are read when the registry is collected
+
+        :param name: name of the gauge
+        :param collector: callable returning (labels, value) pairs
+        """
+        self._collectors[name] = collector
+
+    def quantile(self, name: str, q: float, labels: Labels = ()) -> Union[float, None]:
+        """estimate a quantile of a histogram, see Histogram.quantile
+
+        :param name: name of the histogram
+        :param q: quantile between 0 and 1
+        :param labels: labels of the histogram; default ()
+
+        :return: estimated value or None
+        """
+        with self._lock:
+            histogram = self._histograms.get(name, {}).get(labels)
+            return histogram.quantile(q) if histogram is not None else None
+
+    def _collect(self) -> Dict[str, Dict[Labels, float]]:
+        """gauges including the values of the collectors"""
+        with self._lock:
+            gauges = {name: dict(series) for name, series in self._gauges.items()}
+        for name, collector in list(self._collectors.items()):
+            gauges[name] = dict(collector())
+        return gauges
+
+    def snapshot(self) -> dict:
+        """copy of every metric
+
+        :return: dict of counters, gauges and histograms, each a dict of name to a list of series with their labels
+        """
+        gauges = self._collect()
+        with self._lock:
+            counters = {name: [{'labels': dict(labels), 'value': value} for labels, value in series.items()]
+                        for name, series in self._counters.items()}
+            histograms = {name: [{'labels': dict(labels), 'count': histogram.count, 'sum': histogram.sum,
+                                  'buckets': {str(bound): total for bound, total in histogram.cumulative()},
+                                  'p50': histogram.quantile(0.5), 'p90': histogram.quantile(0.9),
+                                  'p99': histogram.quantile(0.99)}
+                                 for labels, histogram in series.items()]
+                          for name, series in self._histograms.items()}
+        return {'counters': counters,
+                'gauges': {name: [{'labels': dict(labels), 'value': value} for labels, value in series.items()]
+                           for name, series in gauges.items()},
+                'histograms': histograms}
+
+    @staticmethod
+    def _format_labels(labels: Labels, extra: Tuple[str, str] = None) -> str:
+        """format labels for the prometheus text format"""
+        if extra is not None:
+            labels = labels + (extra,)
+        if not labels:
+            return ''
+        escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in labels)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+    def prometheus(self) -> str:
+        """dump every metric in the prometheus text exposition format
+
+        :return: text of the metrics
+        """
+        gauges = self._collect()
+        prefix = f'{self.namespace}_' if self.namespace else ''
+        lines = []
+
+        def header(name: str, kind: str) -> str:
+            if name in METRIC_HELP:
+                lines.append(f'# HELP {prefix}{name} {METRIC_HELP[name]}')
+            lines.append(f'# TYPE {prefix}{name} {kind}')
+            return f'{prefix}{name}'
+
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                metric = header(name, 'counter')
+                lines.extend(f'{metric}{self._format_labels(labels)} {value}' for labels, value in series.items())
+            for name, series in sorted(self._histograms.items()):
+                metric = header(name, 'histogram')
+                for labels, histogram in series.items():
+                    for bound, total in histogram.cumulative():
+                        le = '+Inf' if bound == float('inf') else str(bound)
+                        lines.append(f'{metric}_bucket{self._format_labels(labels, ("le", le))} {total}')
+                    lines.append(f'{metric}_sum{self._format_labels(labels)} {histogram.sum}')
+                    lines.append(f'{metric}_count{self._format_labels(labels)} {histogram.count}')
+        for name, series in sorted(gauges.items()):
+            metric = header(name, 'gauge')
+            lines.extend(f'{metric}{self._format_labels(labels)} {value}' for labels, value in series.items())
+        return '\n'.join(lines) + '\n'
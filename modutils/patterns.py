@@ -0,0 +1,119 @@
+import re
+
+from collections import deque
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+# regex patterns made only of literal characters and escaped punctuation
+LITERAL_REGEX = re.compile(r'(?:[^.^$*+?{}\[\]\\|()]|\\[^A-Za-z0-9])*')
+ESCAPE = re.compile(r'\\(.)')
+
+
+class AhoCorasick(object):
+
+    def __init__(self, words: Iterable[str]):
+        """initialize AhoCorasick
+        an automaton finding which of many literal strings occur in a text in a single pass over the text
+
+        :param words: literal strings to search for
+        """
+        self.words = list(words)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[int, ...]] = [()]
+        self._empty = tuple(index for index, word in enumerate(self.words) if not word)
+        for index, word in enumerate(self.words):
+            if not word:
+                continue
+            state = 0
+            for char in word:
+                following = self._goto[state].get(char)
+                if following is None:
+                    following = self._goto[state][char] = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                state = following
+            self._output[state] += (index,)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in self._goto[state].items():
+                queue.append(following)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[following] = fail if fail != following else 0
+                self._output[following] += self._output[self._fail[following]]
+
+    def search(self, text: str) -> Set[int]:
+        """find the words occurring in a text
+
+        :param text: text to search
+
+        :return: set of the indexes of the words found
+        """
+        goto, fail, output = self._goto, self._fail, self._output
+        found = set(self._empty)
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+
+class PatternSet(object):
+
+    def __init__(self, patterns: Iterable[str], regex: bool = False):
+        """initialize PatternSet
+        match many patterns against a text, with the same matches as matching each pattern on its own
+
+        literal patterns are searched with one AhoCorasick automaton in a single pass, and a text matches a pattern
+        if it contains it. Regex patterns that are plain strings are searched with the automaton too and are matched
+        once per text. Every other regex pattern is compiled once and matched with its own findall, since the
+        matches of different patterns can overlap and an alternation of them would drop all but one
+
+        :param patterns: patterns to match
+        :param regex: flag for using the patterns as regex or string compare; default False
+        """
+        self.patterns = list(patterns)
+        self.regex = regex
+        self._automaton = None if regex else AhoCorasick(self.patterns)
+        self._compiled: List[Tuple[int, re.Pattern]] = []
+        self._literals: List[int] = []
+        if regex:
+            self._compile()
+
+    def _compile(self) -> None:
+        """compile the regex patterns, plain strings go to an automaton"""
+        literals = []
+        for index, pattern in enumerate(self.patterns):
+            if LITERAL_REGEX.fullmatch(pattern):
+                self._literals.append(index)
+                literals.append(ESCAPE.sub(r'\1', pattern))
+            else:
+                self._compiled.append((index, re.compile(pattern)))
+        if literals:
+            self._automaton = AhoCorasick(literals)
+
+    def findall(self, text: str) -> List[Tuple[int, Any]]:
+        """match every pattern in a text
+
+        :param text: text to match
+
+        :return: list of (index of the pattern, match), for literal patterns the match is the text, for regex
+            patterns the matches are the ones re.findall gives
+        """
+        if not self.regex:
+            return [(index, text) for index in sorted(self._automaton.search(text))]
+        matches = []
+        if self._automaton is not None:
+            words = self._automaton.words
+            matches.extend((self._literals[found], words[found]) for found in sorted(self._automaton.search(text)))
+        for index, compiled in self._compiled:
+            matches.extend((index, match) for match in compiled.findall(text))
+        return matches